@@ -26,8 +26,9 @@ import numpy as np
 
 import pyroomacoustics as pra
 from overiva import overiva
+from covariance import WeightedCovariance
 
-def auxiva_pca(X, n_src=None, **kwargs):
+def auxiva_pca(X, n_src=None, layout="frames", **kwargs):
 
     """
     Implementation of overdetermined IVA with PCA followed by determined IVA
@@ -35,7 +36,8 @@ def auxiva_pca(X, n_src=None, **kwargs):
     Parameters
     ----------
     X: ndarray (nframes, nfrequencies, nchannels)
-        STFT representation of the signal
+        STFT representation of the signal, or (nfrequencies, nframes,
+        nchannels) if ``layout`` is 'freq'
     n_src: int, optional
         The number of sources or independent components
     n_iter: int, optional
@@ -51,42 +53,71 @@ def auxiva_pca(X, n_src=None, **kwargs):
     return_filters: bool
         If true, the function will return the demixing matrix too
     callback: func
-        A callback function called every 10 iterations, allows to monitor convergence
+        A callback function called every 10 iterations, allows to monitor
+        convergence, the options of the callback of :py:func:`overiva.overiva`
+        are also accepted
+    layout: str, optional
+        The layout of the input and output, either 'frames' (default) for
+        frames-major arrays, or 'freq' for frequency-major arrays, which
+        avoids the transposed copies of the input and output
 
     Returns
     -------
-    Returns an (nframes, nfrequencies, nsources) array. Also returns
+    Returns an (nframes, nfrequencies, nsources) array, or (nfrequencies,
+    nframes, nsources) if ``layout`` is 'freq'. Also returns
     the demixing matrix (nfrequencies, nchannels, nsources)
     if ``return_values`` keyword is True.
     """
 
-    n_frames, n_freq, n_chan = X.shape
+    if layout == "frames":
+        X_f = X.swapaxes(0, 1)
+    elif layout == "freq":
+        X_f = X
+    else:
+        raise ValueError("Unknown layout {}".format(layout))
+
+    n_chan = X.shape[2]
 
     # default to determined case
     if n_src is None:
-        n_src = X.shape[2]
+        n_src = n_chan
 
     if n_src < n_chan:
-        # compute the cov mat (n_freq, n_chan, n_chan)
-        covmat = np.mean(X[:, :, :, None] * np.conj(X[:, :, None, :]), axis=0)
+        # compute the cov mat (n_freq, n_chan, n_chan), in double precision
+        covmat = WeightedCovariance(X_f.swapaxes(0, 1), n_src).covariance(
+            dtype=np.complex128
+        )
 
         # Compute EVD
-        # v.shape == (n_freq, n_chan), w.shape == (n_freq, n_chan, n_chan)
-        v, w = np.linalg.eigh(covmat)
+        # w.shape == (n_freq, n_chan, n_chan)
+        _, w = np.linalg.eigh(covmat)
+        w = w.astype(X.dtype)
 
         # Apply dimensionality reduction
-        # new shape: (n_frames, n_freq, n_src)
-        new_X = np.matmul(
-            X.swapaxes(0, 1), np.conj(w[:, :, -n_src:])
-        ).swapaxes(0, 1)
+        # new shape: (n_freq, n_frames, n_src)
+        new_X = np.matmul(X_f, np.conj(w[:, :, -n_src:]))
+
+    else:
+        new_X = X_f
 
+    # the callback gets the signals in the layout of the input
+    callback = kwargs.pop("callback", None)
+    if callback is not None and layout == "frames":
+        kwargs["callback"] = lambda Y: callback(Y.swapaxes(0, 1))
     else:
-        new_X = X
+        kwargs["callback"] = callback
 
     kwargs.pop('proj_back')
-    Y = overiva(new_X, proj_back=False, **kwargs)
+    Y = overiva(new_X, proj_back=False, layout="freq", **kwargs)
+
+    # the output in the requested layout, and its frames-major view
+    if layout == "frames":
+        Y = Y.swapaxes(0, 1).copy()
+        Y_t = Y
+    else:
+        Y_t = Y.swapaxes(0, 1)
 
-    z = pra.bss.projection_back(Y, X[:, :, 0])
-    Y *= np.conj(z[None, :, :])
+    z = pra.bss.projection_back(Y_t, X_f[:, :, 0].swapaxes(0, 1))
+    Y_t *= np.conj(z[None, :, :])
 
     return Y
@@ -0,0 +1,602 @@
+# Copyright (c) 2019 Robin Scheibler
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+Computation of the weighted covariance matrices of all the sources needed by
+the auxiliary function based algorithms, of the iterative projection updates
+of the demixing matrices that use them, and of the principal subspace of
+the covariance matrices of all the frequencies.
+"""
+import numpy as np
+
+import kernels
+
+
+def principal_subspace(C, n, n_iter=4, n_power=2, tol=1e-10):
+    """
+    Computes the ``n`` principal eigenvectors of a stack of Hermitian positive
+    semi-definite matrices, all the matrices at once.
+
+    The subspace iteration is run with the matrices raised to the power
+    ``2 ** n_power``, followed by a Rayleigh-Ritz step. The eigenpairs of
+    the matrices where the residual ``||C v - lambda v||`` is larger than
+    ``tol`` times the largest eigenvalue are recomputed with ``eigh``. When
+    ``n`` is more than a quarter of the size of the matrices, the full
+    decompositions are cheaper and ``eigh`` is used directly. The computations
+    are done in double precision.
+
+    Parameters
+    ----------
+    C: ndarray (n_freq, n_chan, n_chan)
+        The Hermitian matrices
+    n: int
+        The number of eigenvectors
+    n_iter: int, optional
+        The number of subspace iterations (default 4)
+    n_power: int, optional
+        The number of squarings of the matrices (default 2)
+    tol: float, optional
+        The relative tolerance on the residual (default 1e-10)
+
+    Returns
+    -------
+    The ``n`` largest eigenvalues (n_freq, n) in increasing order, and the
+    corresponding eigenvectors (n_freq, n_chan, n), with the same ordering
+    as ``eigh``
+    """
+
+    n_chan = C.shape[1]
+
+    C_d = C.astype(np.complex128)
+
+    if 4 * n > n_chan:
+        v, w = np.linalg.eigh(C_d)
+        return v[:, -n:].astype(C.real.dtype), w[:, :, -n:].astype(C.dtype)
+
+    # normalize by the trace so that the powers neither overflow nor underflow
+    trace = np.real(np.trace(C_d, axis1=1, axis2=2))
+    trace[trace <= 0.0] = 1.0
+    P = C_d / trace[:, None, None]
+    for i in range(n_power):
+        P = P @ P
+
+    # start from the columns with the largest diagonal entries of the power
+    diag = np.real(np.diagonal(P, axis1=1, axis2=2))
+    ind = np.argsort(diag, axis=1)[:, None, -n:]
+    Q, _ = np.linalg.qr(np.take_along_axis(P, ind, axis=2))
+
+    for i in range(n_iter):
+        Q, _ = np.linalg.qr(P @ Q)
+
+    # Rayleigh-Ritz step, the eigenvalues are in increasing order
+    CQ = C_d @ Q
+    v, u = np.linalg.eigh(np.conj(Q).swapaxes(1, 2) @ CQ)
+    w = Q @ u
+
+    # the residual of the eigenpairs
+    res = np.linalg.norm(CQ @ u - w * v[:, None, :], axis=1)
+    scale = np.maximum(np.abs(v[:, -1]), np.finfo(np.float64).tiny)
+    bad = np.any(res > tol * scale[:, None], axis=1)
+
+    if np.any(bad):
+        v_bad, w_bad = np.linalg.eigh(C_d[bad])
+        v[bad] = v_bad[:, -n:]
+        w[bad] = w_bad[:, :, -n:]
+
+    return v.astype(C.real.dtype), w.astype(C.dtype)
+
+
+def solve(A, B):
+    """
+    Solves the linear systems ``A X = B`` of a stack of matrices. When some of
+    the matrices are numerically singular, which happens when a source of the
+    model degenerates, the pseudo-inverses of the whole stack are used
+    instead.
+
+    Parameters
+    ----------
+    A: ndarray (n_freq, n_chan, n_chan)
+        The matrices of the systems
+    B: ndarray (n_freq, n_chan, n_rhs)
+        The right hand sides
+
+    Returns
+    -------
+    The solutions (n_freq, n_chan, n_rhs)
+    """
+
+    try:
+        return np.linalg.solve(A, B)
+    except np.linalg.LinAlgError:
+        return np.linalg.pinv(A) @ B
+
+
+def normalize(w, V, w_prev):
+    """
+    Scales the demixing vectors so that ``w^H V w = 1``, in double precision.
+
+    When ``V`` is ill-conditioned, the rounding errors can make ``w^H V w``
+    non-positive, or the vector not finite. The update of these bins is
+    rejected and their previous demixing vectors are kept.
+
+    Parameters
+    ----------
+    w: ndarray (n_freq, n_chan)
+        The demixing vectors
+    V: ndarray (n_freq, n_chan, n_chan)
+        The weighted covariance matrices
+    w_prev: ndarray (n_freq, n_chan)
+        The demixing vectors before the update
+
+    Returns
+    -------
+    The normalized demixing vectors (n_freq, n_chan), in double precision
+    """
+
+    w = w.astype(np.complex128)
+    denom = np.real(np.conj(w[:, None, :]) @ V @ w[:, :, None])[:, 0, 0]
+
+    valid = np.isfinite(denom) & (denom > 0.0)
+    w[valid] /= np.sqrt(denom[valid, None])
+    w[~valid] = w_prev[~valid]
+
+    return w
+
+
+class IterativeProjection(object):
+    """
+    The iterative projection (IP) updates of the demixing matrices
+
+        W_hat = [W, [J; -I]]
+
+    where the ``n_src`` columns of W are the demixing vectors of the sources
+    and, in the overdetermined case, J is given by the orthogonal constraints
+    W^H Cx [J; -I] = 0. The update of source s solves
+
+        (W_hat^H V_s) w_s = e_s
+
+    In the overdetermined case, the first ``n_src`` columns of
+    (W_hat^H)^{-1} are the mixing vectors A = Cx W (W^H Cx W)^{-1} and the
+    update is w_s = V_s^{-1} a_s, which needs neither W_hat^H V_s nor J. A
+    new demixing vector then changes one column of Cx W, one row and one
+    column of G = W^H Cx W, and one row of B = W^H Cx_1 in
+    J = (W^H Cx_1)^{-1} W^H Cx_2. The inverses of G and B, and J, follow by
+    Sherman-Morrison updates in O(n_chan^2) per bin, and the solve with V_s
+    is the only O(n_chan^3) operation left. They are computed from scratch
+    when the object is created, e.g., once per iteration, so that the
+    rounding errors do not accumulate.
+
+    The computations are done in double precision.
+
+    Parameters
+    ----------
+    W_hat: ndarray (n_freq, n_chan, n_chan)
+        The demixing matrices, updated in place
+    Cx: ndarray (n_freq, n_chan, n_chan)
+        The covariance matrices of the input
+    n_src: int
+        The number of sources
+    """
+
+    def __init__(self, W_hat, Cx, n_src):
+
+        self.W_hat = W_hat
+        self.W = W_hat[:, :, :n_src]
+        self.n_src = n_src
+        self.n_chan = W_hat.shape[2]
+
+        if n_src < self.n_chan:
+            self.Cx = Cx.astype(np.complex128, copy=False)
+            self.refresh()
+
+    def refresh(self):
+        """ Computes the inverses of G and B, and J, from scratch """
+
+        n_src = self.n_src
+        eye = np.broadcast_to(np.eye(n_src), (self.W.shape[0], n_src, n_src))
+
+        self.CxW = self.Cx @ self.W
+        self.G_inv = solve(np.conj(self.W).swapaxes(1, 2) @ self.CxW, eye)
+
+        # W^H Cx = (Cx W)^H since Cx is Hermitian
+        WCx = np.conj(self.CxW).swapaxes(1, 2)
+        self.B_inv = solve(WCx[:, :, :n_src], eye)
+        self.J = self.B_inv @ WCx[:, :, n_src:]
+        self.W_hat[:, :n_src, n_src:] = self.J
+
+    def project(self, V, cols):
+        """
+        Solves ``(W_hat^H V) P = [e_c for c in cols]``
+
+        Parameters
+        ----------
+        V: ndarray (n_freq, n_chan, n_chan)
+            The weighted covariance matrices of a source
+        cols: list of int
+            The sources of the right hand sides
+
+        Returns
+        -------
+        The solutions (n_freq, n_chan, len(cols))
+        """
+
+        if self.n_src < self.n_chan:
+            return solve(V, self.CxW @ self.G_inv[:, :, cols])
+
+        eye = np.eye(self.n_chan)[:, cols]
+        WV = np.conj(self.W_hat).swapaxes(1, 2) @ V
+        return solve(WV, np.broadcast_to(eye, WV.shape[:1] + eye.shape))
+
+    def update(self, s, w):
+        """
+        Sets the demixing vectors of source ``s`` to ``w`` (n_freq, n_chan)
+        and updates J according to the orthogonal constraints
+        """
+
+        W, n_src = self.W, self.n_src
+
+        if n_src == self.n_chan:
+            W[:, :, s] = w
+            return
+
+        # the change of the demixing vectors, as stored
+        w = w.astype(W.dtype)
+        dw = (w.astype(np.complex128) - W[:, :, s])[:, :, None]
+        d = self.Cx @ dw
+        d_H = np.conj(d).swapaxes(1, 2)
+
+        # row s of B changes by d_1^H, then
+        # J <- J + B^{-1} e_s (d_2^H - d_1^H J) / (1 + d_1^H B^{-1} e_s)
+        u = self.B_inv[:, :, [s]]
+        beta = 1.0 + d_H[:, :, :n_src] @ u
+        self.J += u * ((d_H[:, :, n_src:] - d_H[:, :, :n_src] @ self.J) / beta)
+        self.B_inv -= u * (d_H[:, :, :n_src] @ self.B_inv / beta)
+
+        # column s of G changes by W^H d, with the previous W
+        z = self.G_inv @ (np.conj(W).swapaxes(1, 2) @ d)
+        self.G_inv -= z * (self.G_inv[:, [s], :] / (1.0 + z[:, [s], :]))
+
+        W[:, :, s] = w
+        self.CxW[:, :, s] += d[:, :, 0]
+
+        # and row s by d^H W, with the new W
+        z = (d_H @ W) @ self.G_inv
+        self.G_inv -= (self.G_inv[:, :, [s]] / (1.0 + z[:, :, [s]])) * z
+
+        # the updates break down when B or G become singular
+        if not (np.all(np.isfinite(self.J)) and np.all(np.isfinite(self.G_inv))):
+            self.refresh()
+        else:
+            self.W_hat[:, :n_src, n_src:] = self.J
+
+
+class WeightedCovariance(object):
+    """
+    Computes the weighted covariance matrices
+
+        V[s, f] = 1 / n_frames * sum_t w[t, s] x[t, f] x[t, f]^H
+
+    of all the sources in a single pass over the data.
+
+    Only the upper triangular part of the Hermitian matrices is computed and
+    stored. The products of the pairs of channels are arranged so that the
+    covariance matrices of all sources are given by one real matrix product
+    with the weights. When the products of all the frequencies fit in
+    ``max_bytes``, they are computed once and kept. Otherwise, the input is
+    streamed block of frequencies by block of frequencies at every update.
+    For every block, either the products of the channels are computed again
+    and multiplied with the weights of all the sources at once, when there
+    are enough sources to share them, or the weighted copies of the input
+    for all the sources are stacked and multiplied with the input by a single
+    complex matrix product.
+
+    The products and their sums are always done in double precision, where
+    the products of the channels of a single precision input are exact. The
+    covariance matrices of the low frequencies are often so ill-conditioned
+    that the rounding errors of single precision products would change the
+    directions of their smallest eigenvalues, and the separation with them.
+
+    With the 'numba' backend, the matrices of all the sources are computed by
+    a compiled kernel in a single pass over the input of every frequency,
+    without any workspace (see :py:mod:`kernels`).
+
+    Parameters
+    ----------
+    X: ndarray (n_frames, n_freq, n_chan)
+        STFT representation of the signal
+    n_src: int
+        The number of sources, i.e. number of sets of weights
+    max_bytes: int, optional
+        The maximum size of the workspace in bytes (default 64 MB)
+    cache: bool, optional
+        If false, the products of the channels are never kept (default True)
+    backend: str, optional
+        Either 'numpy' (default) or 'numba'
+    """
+
+    def __init__(
+        self, X, n_src, max_bytes=2 ** 26, cache=True, backend="numpy"
+    ):
+
+        self.X = X
+        self.n_frames, self.n_freq, self.n_chan = X.shape
+        self.n_src = n_src
+        self.compiled = kernels.use_numba(backend)
+
+        # indices of the upper triangular part, in row-major order
+        self.triu = np.triu_indices(self.n_chan)
+        self.n_tri = self.triu[0].shape[0]
+
+        # the products of the channels take n_frames * n_tri numbers per
+        # frequency, they are kept when they fit in the workspace, otherwise
+        # the input is streamed by blocks of frequencies whose copy, and
+        # products or weighted copies, fit in a few MB so that they stay
+        # in the cache between the two passes over them
+        itemsize = np.dtype(np.complex128).itemsize
+        bytes_per_freq = self.n_frames * self.n_tri * itemsize
+        self.cached = (
+            cache and not self.compiled and self.n_freq * bytes_per_freq <= max_bytes
+        )
+        self.block_len = self.n_frames * max(self.n_tri, self.n_src * self.n_chan)
+        bytes_per_freq = (
+            self.n_frames * self.n_chan + self.block_len + self.n_src * self.n_tri
+        ) * itemsize
+        block_bytes = min(max_bytes, 2 ** 22)
+        self.block_size = int(max(1, min(self.n_freq, block_bytes // bytes_per_freq)))
+
+        # the weights, scaled by the number of frames
+        self.weights = np.zeros((self.n_src, self.n_frames))
+
+        # the upper triangular parts, shape (n_src, n_freq, n_tri),
+        # always in double precision
+        self.tri = np.zeros((self.n_src, self.n_freq, self.n_tri), dtype=np.complex128)
+
+        if self.compiled:
+            return
+
+        if self.cached:
+            self.products = self._products()
+        else:
+            self.X_block = np.zeros(
+                self.n_frames * self.n_chan * self.block_size, dtype=np.complex128
+            )
+            self.P_block = np.zeros(
+                self.block_len * self.block_size, dtype=np.complex128
+            )
+            self.tri_block = np.zeros(
+                self.n_src * self.n_tri * self.block_size, dtype=np.complex128
+            )
+
+    def _products(self):
+        """
+        Products of the channel pairs of all the frequencies, returns the
+        real view, shape (n_frames, 2 * n_freq * n_tri)
+        """
+
+        X = self.X
+        P = np.zeros((self.n_frames, self.n_freq, self.n_tri), dtype=np.complex128)
+
+        k = 0
+        for i in range(self.n_chan):
+            np.multiply(
+                X[:, :, i, None],
+                np.conj(X[:, :, i:]),
+                out=P[:, :, k : k + self.n_chan - i],
+                dtype=np.complex128,
+            )
+            k += self.n_chan - i
+
+        return P.reshape((self.n_frames, -1)).view(np.float64)
+
+    def _block(self, shape, f_start, f_end):
+        """ The copy of the input of a block of frequencies, of any shape """
+
+        n_f = f_end - f_start
+        X = self.X_block[: self.n_frames * self.n_chan * n_f].reshape(shape)
+
+        if shape[0] == n_f:
+            np.copyto(X, self.X[:, f_start:f_end, :].swapaxes(0, 1))
+        else:
+            np.copyto(X, self.X[:, f_start:f_end, :].swapaxes(1, 2))
+
+        return X
+
+    def _block_products(self, weights, tri, f_start, f_end):
+        """
+        The matrices of a block of frequencies by the products of the pairs of
+        channels, computed with the frequencies last so that the loops run
+        over long contiguous rows, and one real matrix product
+        """
+
+        n_src, n_f = weights.shape[0], f_end - f_start
+        X = self._block((self.n_frames, self.n_chan, n_f), f_start, f_end)
+        P = self.P_block[: self.n_frames * self.n_tri * n_f].reshape(
+            (self.n_frames, self.n_tri, n_f)
+        )
+
+        k = 0
+        for i in range(self.n_chan):
+            P_i = P[:, k : k + self.n_chan - i, :]
+            np.conjugate(X[:, i:, :], out=P_i)
+            P_i *= X[:, i, None, :]
+            k += self.n_chan - i
+
+        out = self.tri_block[: n_src * self.n_tri * n_f].reshape(
+            (n_src, self.n_tri, n_f)
+        )
+        np.matmul(
+            weights,
+            P.reshape((self.n_frames, -1)).view(np.float64),
+            out=out.reshape((n_src, -1)).view(np.float64),
+        )
+        tri[:, f_start:f_end, :] = out.swapaxes(1, 2)
+
+    def _block_weighted(self, weights, tri, f_start, f_end):
+        """
+        The matrices of a block of frequencies by one complex matrix product
+        of the weighted copies of the input, stacked for all the sources,
+        with the input
+        """
+
+        n_src, n_f = weights.shape[0], f_end - f_start
+        X = self._block((n_f, self.n_frames, self.n_chan), f_start, f_end)
+        A = self.P_block[: n_f * n_src * self.n_chan * self.n_frames].reshape(
+            (n_f, n_src, self.n_chan, self.n_frames)
+        )
+        np.multiply(X.swapaxes(1, 2)[:, None, :, :], weights[:, None, :], out=A)
+
+        V = A.reshape((n_f, -1, self.n_frames)) @ np.conj(X)
+        V = V.reshape((n_f, n_src, self.n_chan, self.n_chan))
+        tri[:, f_start:f_end, :] = V[:, :, self.triu[0], self.triu[1]].swapaxes(0, 1)
+
+    def _runs(self, active):
+        """ The ranges of contiguous active frequencies """
+
+        if active is None:
+            return [(0, self.n_freq)]
+
+        edges = np.diff(np.concatenate(([0], active.astype(np.int8), [0])))
+        return zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1))
+
+    def _accumulate(self, weights, tri, active=None):
+        """ The matrices of all sources by one matrix product per block """
+
+        n_src = weights.shape[0]
+        blk = 2 * self.n_tri
+
+        # the products of the channels are worth computing when they are
+        # shared by enough sources, otherwise the weighted copies of the
+        # input are multiplied with the input
+        if 3 * n_src > 2 * self.n_chan:
+            block_update = self._block_products
+        else:
+            block_update = self._block_weighted
+
+        # real view of the output, shape (n_src, 2 * n_freq * n_tri)
+        out = tri.reshape((n_src, -1)).view(np.float64)
+
+        for run_start, run_end in self._runs(active):
+
+            if self.cached:
+                cols = slice(run_start * blk, run_end * blk)
+                np.matmul(weights, self.products[:, cols], out=out[:, cols])
+                continue
+
+            for f_start in range(run_start, run_end, self.block_size):
+                f_end = min(f_start + self.block_size, run_end)
+                block_update(weights, tri, f_start, f_end)
+
+    def update(self, weights, active=None):
+        """
+        Compute the weighted covariance matrices of all the sources
+
+        Parameters
+        ----------
+        weights: ndarray (n_frames, n_src)
+            The weights of the frames for every source
+        active: ndarray (n_freq,) of bool, optional
+            If provided, the matrices are only computed for the frequencies
+            where ``active`` is true, the others are left untouched
+
+        Returns
+        -------
+        The upper triangular part of the matrices (n_src, n_freq, n_tri)
+        """
+
+        np.multiply(weights.T, 1.0 / self.n_frames, out=self.weights, dtype=np.float64)
+
+        if self.compiled:
+            if active is None:
+                index = np.arange(self.n_freq)
+            else:
+                index = np.flatnonzero(active)
+            with kernels.lock:
+                kernels.weighted_covariance(
+                    self.X, self.weights, *self.triu, self.tri, index
+                )
+        else:
+            self._accumulate(self.weights, self.tri, active)
+
+        return self.tri
+
+    def covariance(self, out=None, dtype=None):
+        """
+        Computes the covariance matrices of the input, accumulated in
+        double precision
+
+        Parameters
+        ----------
+        out: ndarray (n_freq, n_chan, n_chan), optional
+            The array where to store the matrices
+        dtype: numpy dtype, optional
+            The type of the output when ``out`` is not provided, defaults to
+            the type of the input
+
+        Returns
+        -------
+        The covariance matrices (n_freq, n_chan, n_chan)
+        """
+
+        tri = np.zeros((1, self.n_freq, self.n_tri), dtype=np.complex128)
+        weights = np.full((1, self.n_frames), 1.0 / self.n_frames)
+
+        if self.compiled:
+            with kernels.lock:
+                kernels.weighted_covariance(
+                    self.X, weights, *self.triu, tri, np.arange(self.n_freq)
+                )
+        else:
+            self._accumulate(weights, tri)
+
+        if out is None:
+            out = np.zeros(
+                (self.n_freq, self.n_chan, self.n_chan),
+                dtype=self.X.dtype if dtype is None else dtype,
+            )
+
+        return self._fill(tri[0], out)
+
+    def expand(self, s, out=None):
+        """
+        Fills the full Hermitian covariance matrices of one of the sources
+
+        Parameters
+        ----------
+        s: int
+            The index of the source
+        out: ndarray (n_freq, n_chan, n_chan), optional
+            The array where to store the matrices
+
+        Returns
+        -------
+        The covariance matrices (n_freq, n_chan, n_chan)
+        """
+
+        return self._fill(self.tri[s], out)
+
+    def _fill(self, tri, out):
+        """ Fills full Hermitian matrices from their upper triangular parts """
+
+        if out is None:
+            out = np.zeros((self.n_freq, self.n_chan, self.n_chan), dtype=self.X.dtype)
+
+        out[:, self.triu[1], self.triu[0]] = np.conj(tri)
+        out[:, self.triu[0], self.triu[1]] = tri
+
+        return out
@@ -29,11 +29,138 @@ import numpy as np
 
 from pyroomacoustics.bss import projection_back
 
+import kernels
+from covariance import WeightedCovariance, normalize, principal_subspace, solve
+from parallel import CallbackWorker, FrequencyBlocks
+from source_models import get_model
+
+
+class _ActiveBins(object):
+    """
+    The frequency bins of a block that are still updated by :py:func:`ogive`.
+    Their input, vectors, and covariance matrices are gathered in contiguous
+    arrays, with the bins of the w-steps first and those of the a-steps next,
+    so that the updates work on slices instead of masks. The arrays are only
+    gathered again when some bins converge or change of mode. The squared
+    magnitudes of the output and the log-magnitudes of the mixing vectors of
+    every bin are written in arrays shared by all the blocks. The converged
+    bins are demixed one last time, and their rows are kept until they are
+    woken up, so that the sums over the frequencies are the same for any
+    partition of the frequencies in blocks.
+
+    Parameters
+    ----------
+    X: ndarray (n_freq, n_frames, n_chan)
+        The input of the block
+    w, a: ndarray (n_freq, n_chan, 1)
+        The demixing and mixing vectors of the block, written back by
+        :py:meth:`scatter`
+    lambda_a: ndarray (n_freq, 1, 1)
+        The normalizations of the demixing vectors, written back by
+        :py:meth:`scatter`
+    Cx, Cx_inv: ndarray (n_freq, n_chan, n_chan)
+        The covariance matrices of the input and their inverses
+    delta, mu: ndarray (n_freq, n_chan, 1) and (n_freq, 1, 1)
+        The last steps and the step sizes of the block, written back by
+        :py:meth:`scatter`
+    power: ndarray (n_freq, n_frames, 1)
+        The squared magnitudes of the output of the block
+    log_a: ndarray (n_freq,)
+        The log-magnitudes of the a[f, 0] of the block
+    """
+
+    def __init__(self, X, w, a, lambda_a, Cx, Cx_inv, delta, mu, power, log_a):
+
+        self.X, self.w, self.a, self.lambda_a = X, w, a, lambda_a
+        self.Cx, self.Cx_inv = Cx, Cx_inv
+        self.delta, self.mu = delta, mu
+        self.power, self.log_a = power, log_a
+
+        self.active = np.ones(w.shape[0], dtype=bool)
+        self.bins = None
+
+    def partition(self, I_w):
+        """
+        Gathers the active bins, those with ``I_w`` set first. When all the
+        bins are active and in the same mode, the arrays are views. The
+        vectors of the bins need to be written back by :py:meth:`scatter`
+        before.
+        """
+        bins = np.flatnonzero(self.active)
+        do_w = I_w[bins]
+        self.bins = np.concatenate([bins[do_w], bins[~do_w]])
+        self.n_w = np.count_nonzero(do_w)
+
+        n_bins = len(self.bins)
+        self.identity = n_bins == len(self.active) and self.n_w in [0, n_bins]
+
+        def take(A):
+            return A if self.identity else A[self.bins]
+
+        self.X_c, self.w_c, self.a_c = take(self.X), take(self.w), take(self.a)
+        self.lambda_a_c = take(self.lambda_a)
+        self.Cx_c, self.Cx_inv_c = take(self.Cx), take(self.Cx_inv)
+
+        self.delta_c, self.mu_c = take(self.delta), take(self.mu)
+
+        self.Y_c = np.zeros((n_bins,) + self.power.shape[1:], dtype=self.X.dtype)
+
+        # the masks of the compiled kernel
+        self.I_w = np.arange(n_bins) < self.n_w
+        self.I_a = ~self.I_w
+
+    def scatter(self):
+        """ Writes back the vectors of the active bins """
+        if not self.identity:
+            self.w[self.bins] = self.w_c
+            self.a[self.bins] = self.a_c
+            self.lambda_a[self.bins] = self.lambda_a_c
+            self.delta[self.bins] = self.delta_c
+            self.mu[self.bins] = self.mu_c
+
+    def demix(self, bins=slice(None)):
+        """
+        Computes the output of the active bins, selected by ``bins`` among
+        them, and writes their squared magnitudes and log-magnitudes of the
+        mixing vectors in the shared arrays
+        """
+        if isinstance(bins, slice):
+            np.matmul(self.X_c, np.conj(self.w_c), out=self.Y_c)
+            Y_c = self.Y_c
+        else:
+            Y_c = self.X_c[bins] @ np.conj(self.w_c[bins])
+
+        if self.identity and isinstance(bins, slice):
+            np.abs(Y_c, out=self.power)
+            np.square(self.power, out=self.power)
+            index = bins
+        else:
+            index = bins if self.identity else self.bins[bins]
+            self.power[index] = np.abs(Y_c) ** 2
+        self.log_a[index] = np.log(np.abs(self.a_c[bins, 0, 0]))
+
+    def wake(self):
+        """
+        Makes all the bins active again, :py:meth:`partition` needs to be
+        called next
+        """
+        self.active[:] = True
+
+    def freeze(self, done):
+        """
+        Removes the bins selected by the mask ``done`` of the active bins,
+        :py:meth:`partition` needs to be called next
+        """
+        self.demix(done)
+        self.active[self.bins[done]] = False
+        self.scatter()
+
 
 def ogive(
     X,
     n_iter=4000,
     step_size=0.1,
+    step_control="fixed",
     tol=1e-3,
     update="demix",
     proj_back=True,
@@ -41,7 +168,16 @@ def ogive(
     model="laplace",
     init_eig=False,
     return_filters=False,
+    return_info=False,
     callback=None,
+    callback_period=100,
+    callback_async=False,
+    callback_queue=2,
+    n_jobs=None,
+    layout="frames",
+    backend="numpy",
+    Cx=None,
+    Cx_inv=None,
 ):
 
     """
@@ -55,72 +191,141 @@ def ogive(
     Parameters
     ----------
     X: ndarray (nframes, nfrequencies, nchannels)
-        STFT representation of the signal
+        STFT representation of the signal, or (nfrequencies, nframes,
+        nchannels) if ``layout`` is 'freq'
     n_src: int, optional
         The number of sources or independent components
     n_iter: int, optional
         The number of iterations (default 20)
     step_size: float
-        The step size of the gradient ascent
+        The step size of the gradient ascent, or the initial step size of
+        all the bins with an adaptive step control
+    step_control: str, optional
+        Either 'fixed' (default) for a constant step size, or 'bb' for step
+        sizes adapted in every bin with the short step rule of Barzilai and
+        Borwein, bounded to ``[step_size / 100, step_size * 100]``
     tol: float
-        Stop when the gradient is smaller than this number
+        The bins where the norm of the step is smaller than this number stop
+        being updated until the next multiple of 10 iterations, and the
+        algorithm stops when all the bins have
     update: str
         Selects update of the mixing or demixing matrix, or a switching scheme,
-        possible values: "mix", "demix", "switching"
+        possible values: "mix", "demix", "switching". The switching criterion
+        is computed every 10 iterations, and up to every 160 iterations while
+        no bin changes of mode or is close to the threshold
     proj_back: bool, optional
         Scaling on first mic by back projection (default True)
     W0: ndarray (nfrequencies, nsrc, nchannels), optional
         Initial value for demixing matrix
-    model: str
-        The model of source distribution 'gauss' or 'laplace' (default)
+    model: str or SourceModel
+        The model of source distribution, see :py:func:`overiva.overiva`
     init_eig: bool, optional (default ``False``)
         If ``True``, and if ``W0 is None``, then the weights are initialized
         using the principal eigenvectors of the covariance matrix of the input
         data.
     return_filters: bool
         If true, the function will return the demixing matrix too
+    return_info: bool
+        If true, the function will also return a dictionary containing the
+        number of iterations run (``n_iter``), the number of bins updated
+        (``n_active``), and the value of the surrogate cost (``cost``) at
+        every iteration
     callback: func
-        A callback function called every 10 iterations, allows to monitor
-        convergence
+        A callback function called with the extracted signal every
+        ``callback_period`` iterations, allows to monitor convergence
+    callback_period: int, optional
+        The number of iterations between the calls of the callback
+        (default 100)
+    callback_async: bool, optional
+        If true, the callback is run in a background thread that gets a copy
+        of the demixing vectors, see :py:func:`overiva.overiva`
+    callback_queue: int, optional
+        The maximum number of pending calls of the asynchronous callback
+        (default 2)
+    n_jobs: int, optional
+        If provided, the frequency bins are split in ``n_jobs`` blocks that
+        are updated by a pool of threads, -1 uses all the CPUs (see
+        :py:class:`parallel.FrequencyBlocks`)
+    layout: str, optional
+        The layout of the input, the output, and the signals passed to the
+        callback, either 'frames' (default) for frames-major arrays, or
+        'freq' for frequency-major arrays, which avoids the transposed copies
+        of the input and output
+    backend: str, optional
+        The implementation of the updates, either 'numpy' (default), or
+        'numba' for compiled kernels that fuse the score function and the
+        steps of every bin in a single loop (see :py:mod:`kernels`). The
+        numpy implementation is used when numba is not installed.
+    Cx, Cx_inv: ndarray (nfrequencies, nchannels, nchannels), optional
+        The covariance matrix of the input and its inverse, preferably in
+        double precision, when they are already known, e.g., by
+        :py:func:`ogive_deflation`. They are computed from the input
+        otherwise.
 
     Returns
     -------
-    Returns an (nframes, nfrequencies, nsources) array. Also returns
+    Returns an (nframes, nfrequencies, nsources) array, or (nfrequencies,
+    nframes, nsources) if ``layout`` is 'freq'. Also returns
     the demixing matrix (nfrequencies, nchannels, nsources)
-    if ``return_values`` keyword is True.
+    if ``return_values`` keyword is True, and the info dictionary
+    if ``return_info`` is True.
+
+    The cost is the same as that of :py:func:`overiva.overiva` with one
+    source. With the orthogonal constraint, the determinant of the
+    demixing matrix is 1 / conj(a[0]), so that the cost reduces to
+
+        2 sum_f log|a[f, 0]| + 1 / nframes * sum_t G(y[t])
+
+    with G the contrast function of the source model.
     """
 
-    n_frames, n_freq, n_chan = X.shape
+    if layout == "frames":
+        n_frames, n_freq, n_chan = X.shape
+    elif layout == "freq":
+        n_freq, n_frames, n_chan = X.shape
+        X = X.swapaxes(0, 1)
+    else:
+        raise ValueError("Unknown layout {}".format(layout))
+
     n_src = 1
 
-    # covariance matrix of input signal (n_freq, n_chan, n_chan)
-    Cx = np.mean(X[:, :, :, None] * np.conj(X[:, :, None, :]), axis=0)
-    Cx_inv = np.linalg.inv(Cx)
+    source_model = get_model(model)
+
+    # covariance matrix of input signal (n_freq, n_chan, n_chan), its
+    # inverse and eigenvectors are computed in double precision
+    if Cx is None:
+        Cx = WeightedCovariance(X, n_src).covariance(dtype=np.complex128)
+    if Cx_inv is None:
+        Cx_inv = np.linalg.inv(Cx)
+    Cx_inv = Cx_inv.astype(X.dtype)
     Cx_norm = np.linalg.norm(Cx, axis=(1, 2))
 
     w = np.zeros((n_freq, n_chan, 1), dtype=X.dtype)
     a = np.zeros((n_freq, n_chan, 1), dtype=X.dtype)
+    lambda_a = np.zeros((n_freq, 1, 1), dtype=X.real.dtype)
+
+    # the last steps and the step sizes of all the bins
     delta = np.zeros((n_freq, n_chan, 1), dtype=X.dtype)
-    lambda_a = np.zeros((n_freq, 1, 1), dtype=np.float64)
+    mu = np.full((n_freq, 1, 1), step_size, dtype=X.real.dtype)
+
+    if step_control == "fixed":
+        step_bounds = (step_size, step_size)
+    elif step_control == "bb":
+        step_bounds = (step_size / 100.0, step_size * 100.0)
+    else:
+        raise ValueError("Unknown step control {}".format(step_control))
 
     def tensor_H(T):
         return np.conj(T).swapaxes(1, 2)
 
-    # eigenvectors of the input covariance
-    eigval, eigvec = np.linalg.eig(Cx)
-    lead_eigval = np.max(eigval, axis=1)
-    lead_eigvec = np.zeros((n_freq, n_chan), dtype=Cx.dtype)
-    for f in range(n_freq):
-        ind = np.argmax(eigval[f])
-        lead_eigvec[f, :] = eigvec[f, :, ind]
-
     # initialize A and W
     if W0 is None:
         if init_eig:
 
             # Initialize the demixing matrices with the principal
-            # eigenvector
-            w[:, :, 0] = lead_eigvec
+            # eigenvector of the input covariance
+            _, lead_eigvec = principal_subspace(Cx, 1)
+            w[:, :, :] = lead_eigvec
 
         else:
             # Or with identity
@@ -129,43 +334,61 @@ def ogive(
     else:
         w[:, :] = W0
 
-    def update_a_from_w(I):
-        v_new = Cx[I] @ w[I]
-        lambda_w = 1.0 / np.real(tensor_H(w[I]) @ v_new)
-        a[I, :, :] = lambda_w * v_new
+    Cx = Cx.astype(X.dtype)
+
+    # the normalizations are computed in double precision, the demixing
+    # vectors are only updated for the bins selected by I
+    def update_a_from_w(w, a, Cx):
+        v_new = Cx @ w
+        lambda_w = 1.0 / np.real(tensor_H(w) @ v_new.astype(np.complex128))
+        a[:, :, :] = lambda_w * v_new
 
-    def update_w_from_a(I):
+    def update_w_from_a(w, a, lambda_a, Cx_inv, I):
         v_new = Cx_inv @ a
-        lambda_a[:] = 1.0 / np.real(tensor_H(a) @ v_new)
-        w[I, :, :] = lambda_a[I] * v_new[I]
+        lambda_a[:, :, :] = 1.0 / np.real(tensor_H(a) @ v_new.astype(np.complex128))
+        w[I] = lambda_a[I] * v_new[I]
 
+    # The criterion of [1], the distance of Cx to its rank one approximation
+    # Cbb = lmb * b b^H / ||b||^2 has the closed form
+    #   ||Cx - Cbb||^2 = ||Cx||^2 - 2 Re(lmb) b^H Cx b / ||b||^2 + |lmb|^2
+    # so that only products of vectors are needed, in double precision
     def switching_criterion():
 
-        a_n = a / a[:, :1, :1]
+        a_n = (a / a[:, :1, :1]).astype(np.complex128)
         b_n = Cx @ a_n
-        lmb = b_n[:, :1, :1].copy()  # copy is important here!
-        b_n /= lmb
+        lmb = b_n[:, 0, 0].copy()  # copy is important here!
+        b_n /= lmb[:, None, None]
 
         p1 = np.linalg.norm(a_n - b_n, axis=(1, 2)) / Cx_norm
-        Cbb = (
-            lmb
-            * (b_n @ tensor_H(b_n))
-            / np.linalg.norm(b_n, axis=(1, 2), keepdims=True) ** 2
-        )
-        p2 = np.linalg.norm(Cx - Cbb, axis=(1, 2))
+
+        b_sq = np.sum(np.abs(b_n[:, :, 0]) ** 2, axis=1)
+        quad = np.real(np.sum(np.conj(b_n) * (Cx @ b_n), axis=(1, 2)))
+        p2_sq = Cx_norm ** 2 - 2.0 * np.real(lmb) * quad / b_sq + np.abs(lmb) ** 2
+        p2 = np.sqrt(np.maximum(p2_sq, 0.0))
 
         kappa = p1 * p2 / np.sqrt(n_chan)
 
-        thresh = 0.1
-        I_do_a[:] = kappa >= thresh
-        I_do_w[:] = kappa < thresh
+        I_do_a[:] = kappa >= switch_thresh
+        I_do_w[:] = kappa < switch_thresh
+
+        return kappa
+
+    # The short Barzilai-Borwein step sizes, from the last move mu * delta_prev
+    # and the change of the gradient delta_prev - delta. They are kept where
+    # the contrast is not locally convex along the last move
+    def bb_step(mu, delta_prev, delta):
+        diff = delta_prev - delta
+        curv = np.real(np.sum(np.conj(delta_prev) * diff, axis=(1, 2)))[:, None, None]
+        diff_norm = np.sum(np.abs(diff) ** 2, axis=(1, 2), keepdims=True)
+        I = curv > 0.0
+        mu[I] = np.clip(mu[I] * curv[I] / diff_norm[I], *step_bounds)
 
     # Compute the demixed output
     def demix(Y, X, W):
         Y[:, :, :] = X @ np.conj(W)
 
     # The very first update of a
-    update_a_from_w(np.ones(n_freq, dtype=np.bool))
+    update_a_from_w(w, a, Cx)
 
     if update == "mix":
         I_do_w = np.zeros(n_freq, dtype=np.bool)
@@ -174,86 +397,648 @@ def ogive(
         I_do_w = np.ones(n_freq, dtype=np.bool)
         I_do_a = np.zeros(n_freq, dtype=np.bool)
 
-    r_inv = np.zeros((n_frames, n_src))
-    r = np.zeros((n_frames, n_src))
+    r_inv = np.zeros((n_frames, n_src), dtype=X.real.dtype)
+    r = np.zeros((n_frames, n_src), dtype=X.real.dtype)
 
     # Things are more efficient when the frequencies are over the first axis
     Y = np.zeros((n_freq, n_frames, n_src), dtype=X.dtype)
     X_ref = X  # keep a reference to input signal
-    X = X.swapaxes(0, 1).copy()  # more efficient order for processing
+    if layout == "frames":
+        X = X.swapaxes(0, 1).copy()  # more efficient order for processing
+    else:
+        X = X.swapaxes(0, 1)
+
+    # the callback gets the frequency-major output, before projection back
+    def run_callback(Y):
+        Y_tmp = Y.swapaxes(0, 1)
+        if proj_back:
+            z = projection_back(Y_tmp, X_ref[:, :, 0])
+            Y_tmp = Y_tmp * np.conj(z[None, :, :])
+        callback(Y_tmp if layout == "frames" else Y_tmp.swapaxes(0, 1))
+
+    # or the demixing vectors, to be applied in the background
+    if callback is not None and callback_async:
+        worker = CallbackWorker(
+            lambda w_snap: run_callback(X @ np.conj(w_snap)), max_queue=callback_queue
+        )
+    else:
+        worker = None
+
+    # the trace of the surrogate cost, and the number of bins updated
+    cost = np.zeros(n_iter)
+    n_active = np.zeros(n_iter, dtype=int)
+
+    # the frequency bins are processed by blocks, possibly in parallel
+    pool = FrequencyBlocks(n_freq, n_jobs)
+
+    # the squared magnitudes of the output and the log-magnitudes of the
+    # mixing vectors of all the bins, the frozen bins keep their last values
+    power = np.zeros((n_freq, n_frames, n_src), dtype=X.real.dtype)
+    log_a = np.zeros(n_freq)
+
+    # the bins of every block that are still updated
+    active_sets = pool.map(
+        lambda b, F: _ActiveBins(
+            X[F], w[F], a[F], lambda_a[F], Cx[F], Cx_inv[F], delta[F], mu[F],
+            power[F], log_a[F],
+        )
+    )
+    pool.map(lambda b, F: active_sets[b].partition(I_do_w[F]))
+
+    def scatter_all():
+        for act in active_sets:
+            act.scatter()
+
+    compiled = kernels.use_numba(backend)
+
+    def update_block(b, F):
+        # returns the mask of the active bins whose step is small enough
+        act = active_sets[b]
+        if len(act.bins) == 0:
+            return np.zeros(0, dtype=bool)
+
+        Y_b, X_b, w_b, a_b = act.Y_c, act.X_c, act.w_c, act.a_c
+        delta_b, mu_b = act.delta_c, act.mu_c
+        lambda_a_b, Cx_b, Cx_inv_b = act.lambda_a_c, act.Cx_c, act.Cx_inv_c
+
+        if compiled:
+            with kernels.lock:
+                kernels.ogive_update(
+                    X_b, Y_b, r_inv, w_b, a_b, delta_b, lambda_a_b,
+                    Cx_b, Cx_inv_b, act.I_w, act.I_a, mu_b, *step_bounds,
+                )
+
+        else:
+            I_w, I_a = slice(None, act.n_w), slice(act.n_w, None)
+
+            # Compute the score function
+            psi = r_inv[None, :, :] * np.conj(Y_b)
+
+            # "Nu" in Algo 3 in [1]
+            # shape (n_freq, 1, 1)
+            zeta = Y_b.swapaxes(1, 2) @ psi
+
+            x_psi = (X_b.swapaxes(1, 2) @ psi) / zeta
+
+            # The steps, in w first, and in a next
+            # shape (n_freq, n_chan, 1)
+            delta_new = np.zeros_like(delta_b)
+            delta_new[I_w] = a_b[I_w] - x_psi[I_w]
+            x_psi_a = Cx_inv_b[I_a] @ x_psi[I_a]
+            delta_new[I_a] = w_b[I_a] - x_psi_a * lambda_a_b[I_a]
+
+            if step_control == "bb":
+                bb_step(mu_b, delta_b, delta_new)
+
+            delta_b[:, :, :] = delta_new
+            w_b[I_w] += mu_b[I_w] * delta_b[I_w]
+            a_b[I_a] += mu_b[I_a] * delta_b[I_a]
+
+            # Apply the orthogonal constraints
+            update_a_from_w(w_b[I_w], a_b[I_w], Cx_b[I_w])
+            update_w_from_a(w_b, a_b, lambda_a_b, Cx_inv_b, I_a)
+
+        return np.linalg.norm(delta_b, axis=(1, 2)) < tol
+
+    def freeze_block(b, F):
+        if np.any(done[b]):
+            active_sets[b].freeze(done[b])
+            active_sets[b].partition(I_do_w[F])
+
+    # the switching criterion is computed every 10 iterations at first, the
+    # period is doubled while no bin changes of mode or gets within a factor
+    # of 2 of the threshold, and it is reset otherwise
+    switch_thresh, switch_period, next_switch = 0.1, 10, 0
+
+    # the number of iterations run
+    n_run = 0
 
     for epoch in range(n_iter):
-        # compute the switching criterion
-        if update == "switching" and epoch % 10 == 0:
-            switching_criterion()
+        n_run += 1
+
+        # the converged bins are woken up every 10 iterations since they
+        # depend on the others through r, then the switching criterion is
+        # computed, the bins are only gathered again in the blocks where some
+        # of them changed
+        if epoch % 10 == 0:
+            scatter_all()
+            I_do_w_prev = I_do_w.copy()
+            if update == "switching" and epoch >= next_switch:
+                kappa = switching_criterion()
+
+                # the bins that change of mode start over with the initial step
+                switched = I_do_w != I_do_w_prev
+                delta[switched] = 0.0
+                mu[switched] = step_size
+
+                margin = np.abs(np.log(kappa / switch_thresh))
+                if np.any(switched) or np.any(margin < np.log(2.0)):
+                    switch_period = 10
+                else:
+                    switch_period = min(switch_period * 2, 160)
+                next_switch = epoch + switch_period
+
+            for b, F in enumerate(pool.blocks):
+                act = active_sets[b]
+                if not np.all(act.active) or np.any(I_do_w[F] != I_do_w_prev[F]):
+                    act.wake()
+                    act.partition(I_do_w[F])
+
+        n_active[epoch] = sum(len(act.bins) for act in active_sets)
 
         # Extract the target signal
-        demix(Y, X, w)
+        pool.map(lambda b, F: active_sets[b].demix())
+        norms = np.sum(power, axis=0)
 
         # Now run any necessary callback
-        if callback is not None and epoch % 100 == 0:
-            Y_tmp = Y.swapaxes(0, 1)
-            if proj_back:
-                z = projection_back(Y_tmp, X_ref[:, :, 0])
-                callback(Y_tmp * np.conj(z[None, :, :]))
+        if callback is not None and epoch % callback_period == 0:
+            scatter_all()
+            if worker is None:
+                demix(Y, X, w)
+                run_callback(Y)
             else:
-                callback(Y_tmp)
+                worker.submit(w.copy())
 
-        # simple loop as a start
-        # shape: (n_frames, n_src)
-        if model == "laplace":
-            r[:, :] = np.linalg.norm(Y, axis=0) / np.sqrt(n_freq)
-
-        elif model == "gauss":
-            r[:, :] = (np.linalg.norm(Y, axis=0) ** 2) / n_freq
+        # the auxiliary variables, shape: (n_frames, n_src), and the cost of
+        # the current demixing vectors, the scale of r does not matter since
+        # the score function is normalized by zeta
+        cost[epoch] = source_model.auxiliary(norms, n_freq, r) / n_frames
+        cost[epoch] += 2.0 * np.sum(log_a)
 
         eps = 1e-15
         r[r < eps] = eps
 
         r_inv[:, :] = 1.0 / r
 
-        # Compute the score function
-        psi = r_inv[None, :, :] * np.conj(Y)
+        # the blocks are independent until the next computation of r
+        done = pool.map(update_block)
+
+        # the bins whose step is small enough stop being updated, they are
+        # only removed when there are enough of them to pay for the copies,
+        # counted over all the blocks so that the bins that are removed do
+        # not depend on the blocks
+        if sum(np.count_nonzero(d) for d in done) >= max(1, n_active[epoch] // 8):
+            pool.map(freeze_block)
+
+        if not any(len(act.bins) for act in active_sets):
+            break
+
+    scatter_all()
+
+    pool.close()
+
+    if worker is not None:
+        worker.close()
+
+    # Extract target
+    demix(Y, X, w)
+
+    # frames-major view of the output
+    if layout == "frames":
+        Y = Y.swapaxes(0, 1).copy()
+        Y_t = Y
+    else:
+        Y_t = Y.swapaxes(0, 1)
+
+    if proj_back:
+        z = projection_back(Y_t, X_ref[:, :, 0])
+        Y_t *= np.conj(z[None, :, :])
+
+    ret = (Y,)
+
+    if return_filters:
+        ret += (w,)
+
+    if return_info:
+        info = {"n_iter": n_run, "n_active": n_active[:n_run], "cost": cost[:n_run]}
+        ret += (info,)
+
+    if len(ret) == 1:
+        return Y
+    else:
+        return ret
+
+
+def ogive_deflation(
+    X,
+    n_src=1,
+    proj_back=True,
+    init_eig=True,
+    return_filters=False,
+    return_info=False,
+    **kwargs,
+):
+
+    """
+    Extraction of several targets with :py:func:`ogive`, one after the other.
+    After every extraction, the input is restricted to the subspace
+    orthogonal to the mixing vector of the target, so that the next targets
+    are uncorrelated with the previous ones. The covariance matrix of the
+    restricted input and its inverse are obtained from the previous ones by a
+    rank one update and a projection, instead of being computed again, since
+    with the orthogonal constraint
+
+        Cx^-1 a = w / (w^H Cx w)
+
+    With ``init_eig``, the principal eigenvectors of the covariance matrix of
+    the input are computed once, and the k-th of them, restricted to the
+    current subspace, is the initial demixing vector of the k-th extraction.
+
+    Parameters
+    ----------
+    X: ndarray (nframes, nfrequencies, nchannels)
+        STFT representation of the signal
+    n_src: int, optional
+        The number of targets to extract (default 1)
+    proj_back: bool, optional
+        Scaling on first mic by back projection (default True)
+    init_eig: bool, optional (default ``True``)
+        If ``True``, the extractions start from the principal eigenvectors of
+        the covariance matrix of the input, otherwise from the first channel
+        of the current subspace
+    return_filters: bool
+        If true, the function will return the demixing matrix too
+    return_info: bool
+        If true, the function will also return a dictionary containing the
+        total number of iterations run (``n_iter``), the numbers of
+        iterations of every extraction (``n_iter_src``), and the values of
+        the surrogate costs of all the extractions, one after the other
+        (``cost``)
+    kwargs:
+        The other options are passed to :py:func:`ogive`
+
+    Returns
+    -------
+    Returns an (nframes, nfrequencies, nsources) array. Also returns
+    the demixing matrix (nfrequencies, nchannels, nsources)
+    if ``return_filters`` keyword is True, and the info dictionary
+    if ``return_info`` is True.
+    """
 
-        # "Nu" in Algo 3 in [1]
-        # shape (n_freq, 1, 1)
-        zeta = Y.swapaxes(1, 2) @ psi
+    n_frames, n_freq, n_chan = X.shape
 
-        x_psi = (X.swapaxes(1, 2) @ psi) / zeta
+    if n_src > n_chan:
+        raise ValueError("Cannot extract more targets than there are channels")
 
-        # The w-step
-        # shape (n_freq, n_chan, 1)
-        delta[I_do_w] = a[I_do_w] - x_psi[I_do_w]
-        w[I_do_w] += step_size * delta[I_do_w]
+    def tensor_H(T):
+        return np.conj(T).swapaxes(1, 2)
 
-        # The a-step
-        # shape (n_freq, n_chan, 1)
-        delta[I_do_a] = w[I_do_a] - (Cx_inv[I_do_a] @ x_psi[I_do_a]) * lambda_a[I_do_a]
-        a[I_do_a] += step_size * delta[I_do_a]
+    # covariance matrix of input signal (n_freq, n_chan, n_chan) and its
+    # inverse, in double precision
+    Cx = WeightedCovariance(X, 1).covariance(dtype=np.complex128)
+    Cx_inv = np.linalg.inv(Cx)
 
-        # Apply the orthogonal constraints
-        update_a_from_w(I_do_w)
-        update_w_from_a(I_do_a)
+    if init_eig:
+        # the leading eigenvector first
+        _, eigvec = principal_subspace(Cx, n_src)
+        eigvec = eigvec[:, :, ::-1]
 
-        max_delta = np.max(np.linalg.norm(delta, axis=(1, 2)))
+    # the orthonormal basis of the current subspace, and the input restricted
+    # to it, frequency-major (n_freq, n_frames, n_chan)
+    B = np.tile(np.eye(n_chan, dtype=np.complex128), (n_freq, 1, 1))
+    Z = X.swapaxes(0, 1).copy()
+
+    Y = np.zeros((n_freq, n_frames, n_src), dtype=X.dtype)
+    W = np.zeros((n_freq, n_chan, n_src), dtype=X.dtype)
+    n_iter_src, costs = [], []
+
+    for s in range(n_src):
+
+        W0 = tensor_H(B) @ eigvec[:, :, s, None] if init_eig else None
+
+        Y[:, :, s : s + 1], w, info = ogive(
+            Z,
+            proj_back=False,
+            W0=W0,
+            return_filters=True,
+            return_info=True,
+            layout="freq",
+            Cx=Cx,
+            Cx_inv=Cx_inv,
+            **kwargs,
+        )
+        W[:, :, s : s + 1] = B @ w
 
-        if max_delta < tol:
+        n_iter_src.append(info["n_iter"])
+        costs.append(info["cost"])
+
+        if s == n_src - 1:
             break
 
-    # Extract target
-    demix(Y, X, w)
+        # the mixing vector of the target, and an orthonormal basis of its
+        # orthogonal complement, shape (n_freq, n_sub, n_sub - 1)
+        w = w.astype(np.complex128)
+        a = Cx @ w
+        Q = np.linalg.qr(a, mode="complete")[0][:, :, 1:]
+
+        # rank one update of the inverse, then restriction of both matrices
+        # and of the input to the complement
+        Cx_inv -= (w @ tensor_H(w)) / np.real(tensor_H(w) @ a)
+        Cx_inv = tensor_H(Q) @ Cx_inv @ Q
+        Cx = tensor_H(Q) @ Cx @ Q
+        B = B @ Q
+        Z = Z @ np.conj(Q).astype(X.dtype)
 
     Y = Y.swapaxes(0, 1).copy()
-    X = X.swapaxes(0, 1)
 
     if proj_back:
-        z = projection_back(Y, X_ref[:, :, 0])
+        z = projection_back(Y, X[:, :, 0])
         Y *= np.conj(z[None, :, :])
 
+    ret = (Y,)
+
     if return_filters:
-        return Y, w
+        ret += (W,)
+
+    if return_info:
+        info = {
+            "n_iter": sum(n_iter_src),
+            "n_iter_src": np.array(n_iter_src),
+            "cost": np.concatenate(costs),
+        }
+        ret += (info,)
+
+    if len(ret) == 1:
+        return Y
+    else:
+        return ret
+
+
+def auxive(
+    X,
+    n_iter=50,
+    tol=1e-8,
+    proj_back=True,
+    W0=None,
+    model="laplace",
+    init_eig=False,
+    return_filters=False,
+    return_info=False,
+    callback=None,
+    callback_period=10,
+    callback_async=False,
+    callback_queue=2,
+    n_jobs=None,
+    layout="frames",
+    backend="numpy",
+):
+
+    """
+    Independent vector extraction with the orthogonal constraint, based on
+    auxiliary functions. The demixing vector of the target is updated by
+    iterative projection, and its mixing vector by the orthogonal constraint
+    as in :py:func:`ogive`, so that the cost of :py:func:`ogive` decreases
+    without any step size to tune. A few tens of iterations are typically
+    enough. The result is the same as that of :py:func:`overiva.overiva`
+    with ``n_src=1``, without the computations of the background subspace.
+
+    R. Scheibler and N. Ono, Independent Vector Analysis with more Microphones than Sources, arXiv, 2019.
+    https://arxiv.org/abs/1905.07880
+
+    Parameters
+    ----------
+    X: ndarray (nframes, nfrequencies, nchannels)
+        STFT representation of the signal, or (nfrequencies, nframes,
+        nchannels) if ``layout`` is 'freq'
+    n_iter: int, optional
+        The number of iterations (default 50)
+    tol: float
+        Stop when the largest change of direction of the demixing vectors
+        over one iteration, 1 - |w_old^H w_new|^2 / (||w_old||^2 ||w_new||^2),
+        is smaller than this number (default 1e-8)
+    proj_back: bool, optional
+        Scaling on first mic by back projection (default True)
+    W0: ndarray (nfrequencies, nchannels, 1), optional
+        Initial value for demixing vector
+    model: str or SourceModel
+        The model of source distribution, see :py:func:`overiva.overiva`
+    init_eig: bool, optional (default ``False``)
+        If ``True``, and if ``W0 is None``, then the weights are initialized
+        using the principal eigenvectors of the covariance matrix of the input
+        data.
+    return_filters: bool
+        If true, the function will return the demixing matrix too
+    return_info: bool
+        If true, the function will also return a dictionary containing the
+        number of iterations run (``n_iter``) and the value of the cost at
+        every iteration (``cost``)
+    callback: func
+        A callback function called with the extracted signal every
+        ``callback_period`` iterations, allows to monitor convergence
+    callback_period: int, optional
+        The number of iterations between the calls of the callback
+        (default 10)
+    callback_async: bool, optional
+        If true, the callback is run in a background thread that gets a copy
+        of the demixing vectors, see :py:func:`overiva.overiva`
+    callback_queue: int, optional
+        The maximum number of pending calls of the asynchronous callback
+        (default 2)
+    n_jobs: int, optional
+        If provided, the frequency bins are split in ``n_jobs`` blocks that
+        are updated by a pool of threads, -1 uses all the CPUs (see
+        :py:class:`parallel.FrequencyBlocks`)
+    layout: str, optional
+        The layout of the input, the output, and the signals passed to the
+        callback, either 'frames' (default) for frames-major arrays, or
+        'freq' for frequency-major arrays, which avoids the transposed copies
+        of the input and output
+    backend: str, optional
+        The implementation of the weighted covariance matrices, either
+        'numpy' (default), or 'numba' (see :py:mod:`kernels`)
+
+    Returns
+    -------
+    Returns an (nframes, nfrequencies, 1) array, or (nfrequencies,
+    nframes, 1) if ``layout`` is 'freq'. Also returns
+    the demixing matrix (nfrequencies, nchannels, 1)
+    if ``return_values`` keyword is True, and the info dictionary
+    if ``return_info`` is True.
+
+    The cost is that of :py:func:`ogive`.
+    """
+
+    if layout == "frames":
+        n_frames, n_freq, n_chan = X.shape
+    elif layout == "freq":
+        n_freq, n_frames, n_chan = X.shape
+        X = X.swapaxes(0, 1)
+    else:
+        raise ValueError("Unknown layout {}".format(layout))
+
+    n_src = 1
+
+    source_model = get_model(model)
+
+    # the frequency bins are processed by blocks, possibly in parallel
+    pool = FrequencyBlocks(n_freq, n_jobs)
+
+    # computes the auxiliary variables in one pass per block
+    covs = pool.map(
+        lambda b, F: WeightedCovariance(
+            X[:, F], n_src, max_bytes=2 ** 26 // len(pool), backend=backend
+        )
+    )
+
+    # covariance matrix of input signal (n_freq, n_chan, n_chan), the
+    # covariance matrices are kept in double precision so that the updates
+    # are solved in double precision
+    Cx = np.zeros((n_freq, n_chan, n_chan), dtype=np.complex128)
+    pool.map(lambda b, F: covs[b].covariance(out=Cx[F]))
+
+    w = np.zeros((n_freq, n_chan, 1), dtype=X.dtype)
+    a = np.zeros((n_freq, n_chan, 1), dtype=X.dtype)
+    V = np.zeros((n_freq, n_chan, n_chan), dtype=np.complex128)
+
+    def tensor_H(T):
+        return np.conj(T).swapaxes(1, 2)
+
+    # initialize A and W
+    if W0 is None:
+        if init_eig:
+            # Initialize the demixing vectors with the principal
+            # eigenvector of the input covariance
+            _, lead_eigvec = principal_subspace(Cx, 1)
+            w[:, :, :] = np.conj(lead_eigvec)
+
+        else:
+            # Or with identity
+            w[:, 0] = 1.0
+
+    else:
+        w[:, :] = W0
+
+    # the orthogonal constraint gives the mixing vector
+    def update_a_from_w(F=slice(None)):
+        v_new = Cx[F] @ w[F]
+        a[F] = v_new / (tensor_H(w[F]) @ v_new)
+
+    update_a_from_w()
+
+    r_inv = np.zeros((n_frames, n_src), dtype=X.real.dtype)
+    r = np.zeros((n_frames, n_src), dtype=X.real.dtype)
+
+    # Things are more efficient when the frequencies are over the first axis
+    Y = np.zeros((n_freq, n_frames, n_src), dtype=X.dtype)
+    X_ref = X  # keep a reference to input signal
+    if layout == "frames":
+        X = X.swapaxes(0, 1).copy()  # more efficient order for processing
+    else:
+        X = X.swapaxes(0, 1)
+
+    # the callback gets the frequency-major output, before projection back
+    def run_callback(Y):
+        Y_tmp = Y.swapaxes(0, 1)
+        if proj_back:
+            z = projection_back(Y_tmp, X_ref[:, :, 0])
+            Y_tmp = Y_tmp * np.conj(z[None, :, :])
+        callback(Y_tmp if layout == "frames" else Y_tmp.swapaxes(0, 1))
+
+    # or the demixing vectors, to be applied in the background
+    if callback is not None and callback_async:
+        worker = CallbackWorker(
+            lambda w_snap: run_callback(X @ np.conj(w_snap)), max_queue=callback_queue
+        )
+    else:
+        worker = None
+
+    # the trace of the cost
+    cost = np.zeros(n_iter)
+
+    def demix_block(b, F):
+        # returns the squared norms of the output of the block
+        Y[F] = X[F] @ np.conj(w[F])
+        return np.sum(np.abs(Y[F]) ** 2, axis=0)
+
+    def update_block(b, F):
+        w_b, V_b = w[F], V[F]
+        w_old = w_b.copy()
+
+        # The auxiliary variable, shape (n_freq, n_chan, n_chan)
+        covs[b].update(r_inv)
+        covs[b].expand(0, out=V_b)
+
+        # The IP update, the mixing vector is the first column of
+        # (W_hat^H)^{-1}
+        w_new = solve(V_b, a[F])[:, :, 0]
+        w_b[:, :, 0] = normalize(w_new, V_b, w_old[:, :, 0])
+
+        update_a_from_w(F)
+
+        # the change of direction of the demixing vectors
+        corr = np.abs(tensor_H(w_old) @ w_b)[:, 0, 0] ** 2
+        corr /= np.linalg.norm(w_old, axis=(1, 2)) ** 2
+        corr /= np.linalg.norm(w_b, axis=(1, 2)) ** 2
+        return np.max(1.0 - corr)
+
+    # the number of iterations run
+    n_run = 0
+
+    for epoch in range(n_iter):
+        n_run += 1
+
+        # Extract the target signal
+        norms = sum(pool.map(demix_block))
+
+        # Now run any necessary callback
+        if callback is not None and epoch % callback_period == 0:
+            if worker is None:
+                run_callback(Y)
+            else:
+                worker.submit(w.copy())
+
+        # the auxiliary variables, shape: (n_frames, n_src), and the cost of
+        # the current demixing vectors
+        cost[epoch] = source_model.auxiliary(norms, n_freq, r) / n_frames
+        cost[epoch] += 2.0 * np.sum(np.log(np.abs(a[:, 0, 0])), dtype=np.float64)
+
+        # set the scale of r, the demixing vectors are rescaled by the update
+        if source_model.degree is not None:
+            gamma = r.mean(axis=0)
+            r /= gamma[None, :]
+
+        eps = 1e-15
+        r[r < eps] = eps
+
+        r_inv[:, :] = 1.0 / r
+
+        # the blocks are independent until the next computation of r
+        max_change = max(pool.map(update_block))
+
+        if max_change < tol:
+            break
+
+    pool.close()
+
+    if worker is not None:
+        worker.close()
+
+    # Extract target
+    Y[:, :, :] = X @ np.conj(w)
+
+    # frames-major view of the output
+    if layout == "frames":
+        Y = Y.swapaxes(0, 1).copy()
+        Y_t = Y
     else:
+        Y_t = Y.swapaxes(0, 1)
+
+    if proj_back:
+        z = projection_back(Y_t, X_ref[:, :, 0])
+        Y_t *= np.conj(z[None, :, :])
+
+    ret = (Y,)
+
+    if return_filters:
+        ret += (w,)
+
+    if return_info:
+        ret += ({"n_iter": n_run, "cost": cost[:n_run]},)
+
+    if len(ret) == 1:
         return Y
+    else:
+        return ret
 
 
 def ogive_matlab_wrapper(
@@ -358,20 +1143,13 @@ def ogive_matlab_wrapper(
     def tensor_H(T):
         return np.conj(T).swapaxes(1, 2)
 
-    # eigenvectors of the input covariance
-    eigval, eigvec = np.linalg.eig(Cx)
-    lead_eigval = np.max(eigval, axis=1)
-    lead_eigvec = np.zeros((n_freq, n_chan), dtype=Cx.dtype)
-    for f in range(n_freq):
-        ind = np.argmax(eigval[f])
-        lead_eigvec[f, :] = eigvec[f, :, ind]
-
     # initialize A and W
     if W0 is None:
         if init_eig:
             # Initialize the demixing matrices with the principal
-            # eigenvector
-            w[:, :, 0] = lead_eigvec
+            # eigenvector of the input covariance
+            _, lead_eigvec = principal_subspace(Cx, 1)
+            w[:, :, :] = lead_eigvec
 
         else:
             # Or with identity
@@ -0,0 +1,532 @@
+# Copyright (c) 2019 Robin Scheibler
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+Compiled kernels for the inner loops of overiva and ogive. The updates of a
+frequency bin, i.e., chains of products and solves of tiny matrices, are
+fused in a single loop without temporary arrays, and the bins are processed
+in parallel. The kernels need numba, when it is not installed the algorithms
+fall back to their numpy implementation.
+"""
+import threading, warnings
+
+import numpy as np
+
+try:
+    import numba
+
+    has_numba = True
+except ImportError:
+    has_numba = False
+
+# the kernels are parallel over the bins already, their calls from the
+# threads of parallel.FrequencyBlocks are serialized, which is also needed
+# by the default threading layer of numba
+lock = threading.Lock()
+
+
+def use_numba(backend):
+    """
+    Checks the ``backend`` option of the algorithms, either 'numpy' or
+    'numba', and returns True if the compiled kernels should be used. When
+    numba is requested but not installed, a warning is issued and the numpy
+    implementation is used instead.
+    """
+
+    if backend == "numpy":
+        return False
+    elif backend == "numba":
+        if not has_numba:
+            warnings.warn("numba is not installed, falling back to numpy")
+        return has_numba
+    else:
+        raise ValueError("Unknown backend {}".format(backend))
+
+
+if has_numba:
+
+    @numba.njit(cache=True)
+    def _solve(A, B):
+        """
+        Solves ``A X = B`` by Gaussian elimination with partial pivoting, the
+        matrices are overwritten and the solution is left in ``B``
+        """
+
+        n, m = B.shape
+
+        for k in range(n):
+            p = k
+            for i in range(k + 1, n):
+                if abs(A[i, k]) > abs(A[p, k]):
+                    p = i
+            if p != k:
+                for j in range(n):
+                    A[k, j], A[p, j] = A[p, j], A[k, j]
+                for j in range(m):
+                    B[k, j], B[p, j] = B[p, j], B[k, j]
+
+            for i in range(k + 1, n):
+                l = A[i, k] / A[k, k]
+                for j in range(k + 1, n):
+                    A[i, j] -= l * A[k, j]
+                for j in range(m):
+                    B[i, j] -= l * B[k, j]
+
+        for k in range(n - 1, -1, -1):
+            for j in range(m):
+                acc = B[k, j]
+                for i in range(k + 1, n):
+                    acc -= A[k, i] * B[i, j]
+                B[k, j] = acc / A[k, k]
+
+    @numba.njit(cache=True)
+    def _cho_solve(A, b):
+        """
+        Solves ``A x = b`` for a Hermitian positive definite matrix by its
+        Cholesky factorization, with half the operations of the Gaussian
+        elimination. The lower triangular factor overwrites ``A`` and the
+        solution ``b``. Returns False, with ``A`` and ``b`` partly
+        overwritten, when the matrix is not numerically positive definite
+        """
+
+        n = A.shape[0]
+
+        for j in range(n):
+            acc = A[j, j].real
+            for k in range(j):
+                acc -= A[j, k].real ** 2 + A[j, k].imag ** 2
+            if not acc > 0.0:
+                return False
+            A[j, j] = np.sqrt(acc)
+            for i in range(j + 1, n):
+                z = A[i, j]
+                for k in range(j):
+                    z -= A[i, k] * np.conj(A[j, k])
+                A[i, j] = z / A[j, j].real
+
+        for i in range(n):
+            z = b[i]
+            for k in range(i):
+                z -= A[i, k] * b[k]
+            b[i] = z / A[i, i].real
+
+        for i in range(n - 1, -1, -1):
+            z = b[i]
+            for k in range(i + 1, n):
+                z -= np.conj(A[k, i]) * b[k]
+            b[i] = z / A[i, i].real
+
+        return True
+
+    @numba.njit(cache=True)
+    def _orth_const(C, W, n_src, CxW, G_inv, B_inv):
+        """
+        Computes Cx W, the inverses of G = W^H Cx W and of B = W^H Cx_1, and
+        J = B^{-1} W^H Cx_2 in the upper right block of ``W``, from scratch
+        """
+
+        n_chan = W.shape[0]
+
+        for i in range(n_chan):
+            for j in range(n_src):
+                acc = 0j
+                for k in range(n_chan):
+                    acc += C[i, k] * W[k, j]
+                CxW[i, j] = acc
+
+        G = np.zeros((n_src, n_src), dtype=np.complex128)
+        B = np.zeros((n_src, n_src), dtype=np.complex128)
+        for i in range(n_src):
+            for j in range(n_src):
+                acc = 0j
+                for k in range(n_chan):
+                    acc += np.conj(W[k, i]) * CxW[k, j]
+                G[i, j] = acc
+                B[i, j] = np.conj(CxW[j, i])
+                G_inv[i, j] = 1.0 if i == j else 0.0
+                B_inv[i, j] = 1.0 if i == j else 0.0
+        _solve(G, G_inv)
+        _solve(B, B_inv)
+
+        for i in range(n_src):
+            for j in range(n_chan - n_src):
+                acc = 0j
+                for k in range(n_src):
+                    acc += B_inv[i, k] * np.conj(CxW[n_src + j, k])
+                W[i, n_src + j] = acc
+
+    @numba.njit(cache=True)
+    def _orth_update(C, W, n_src, s, w, CxW, G_inv, B_inv, d, v):
+        """
+        Sets the demixing vector of source ``s`` to ``w`` and updates Cx W,
+        the inverses of G and B, and J, by Sherman-Morrison updates. The
+        arrays ``d`` (n_chan,) and ``v`` (3, n_src) are the workspace
+        """
+
+        n_chan = W.shape[0]
+        u, z, r = v[0], v[1], v[2]
+
+        # the change of Cx W
+        for i in range(n_chan):
+            acc = 0j
+            for k in range(n_chan):
+                acc += C[i, k] * (w[k] - W[k, s])
+            d[i] = acc
+
+        # row s of B changes by d_1^H, J is in the upper right block of W
+        beta = 1.0 + 0j
+        for i in range(n_src):
+            u[i] = B_inv[i, s]
+            beta += np.conj(d[i]) * u[i]
+        for j in range(n_src, n_chan):
+            q = np.conj(d[j])
+            for k in range(n_src):
+                q -= np.conj(d[k]) * W[k, j]
+            q /= beta
+            for i in range(n_src):
+                W[i, j] += u[i] * q
+        for j in range(n_src):
+            q = 0j
+            for k in range(n_src):
+                q += np.conj(d[k]) * B_inv[k, j]
+            q /= beta
+            for i in range(n_src):
+                B_inv[i, j] -= u[i] * q
+
+        # column s of G changes by W^H d, with the previous W
+        for i in range(n_src):
+            acc = 0j
+            for k in range(n_chan):
+                acc += np.conj(W[k, i]) * d[k]
+            u[i] = acc
+        for i in range(n_src):
+            acc = 0j
+            for j in range(n_src):
+                acc += G_inv[i, j] * u[j]
+            z[i] = acc
+        for j in range(n_src):
+            r[j] = G_inv[s, j] / (1.0 + z[s])
+        for i in range(n_src):
+            for j in range(n_src):
+                G_inv[i, j] -= z[i] * r[j]
+
+        for i in range(n_chan):
+            W[i, s] = w[i]
+            CxW[i, s] += d[i]
+
+        # and row s by d^H W, with the new W
+        for j in range(n_src):
+            acc = 0j
+            for k in range(n_chan):
+                acc += np.conj(d[k]) * W[k, j]
+            u[j] = acc
+        for j in range(n_src):
+            acc = 0j
+            for i in range(n_src):
+                acc += u[i] * G_inv[i, j]
+            z[j] = acc
+        for i in range(n_src):
+            r[i] = G_inv[i, s] / (1.0 + z[s])
+
+        # the updates break down when B or G become singular, then the sum
+        # of the entries is not finite
+        acc = 0j
+        for i in range(n_src):
+            for j in range(n_src):
+                G_inv[i, j] -= r[i] * z[j]
+                acc += G_inv[i, j]
+            for j in range(n_src, n_chan):
+                acc += W[i, j]
+        if not np.isfinite(acc.real + acc.imag):
+            _orth_const(C, W, n_src, CxW, G_inv, B_inv)
+
+    @numba.njit(parallel=True, cache=True)
+    def ip_update(tri, triu0, triu1, Cx, W_hat, n_src, index):
+        """
+        Iterative projection updates of all the sources of the bins in
+        ``index``, the compiled version of
+        :py:class:`covariance.IterativeProjection`. In the overdetermined
+        case, the mixing vectors are given by the orthogonal constraints and
+        the inverses of the small matrices, and J, follow Sherman-Morrison
+        updates. The computations are done in double precision.
+
+        Parameters
+        ----------
+        tri: ndarray (n_src, n_freq, n_tri)
+            The upper triangular parts of the weighted covariance matrices
+        triu0, triu1: ndarray (n_tri,)
+            The row and column indices of the upper triangular parts
+        Cx: ndarray (n_freq, n_chan, n_chan)
+            The covariance matrices of the input
+        W_hat: ndarray (n_freq, n_chan, n_chan)
+            The demixing matrices, updated in place
+        n_src: int
+            The number of sources
+        index: ndarray of int
+            The bins to update
+        """
+
+        n_chan = W_hat.shape[1]
+        n_tri = triu0.shape[0]
+
+        for i_f in numba.prange(index.shape[0]):
+            f = index[i_f]
+
+            V = np.zeros((n_chan, n_chan), dtype=np.complex128)
+            M = np.zeros((n_chan, n_chan), dtype=np.complex128)
+            x = np.zeros((n_chan, 1), dtype=np.complex128)
+            W = np.zeros((n_chan, n_chan), dtype=np.complex128)
+            C = np.zeros((n_chan, n_chan), dtype=np.complex128)
+            for i in range(n_chan):
+                for j in range(n_chan):
+                    W[i, j] = W_hat[f, i, j]
+                    C[i, j] = Cx[f, i, j]
+
+            CxW = np.zeros((n_chan, n_src), dtype=np.complex128)
+            G_inv = np.zeros((n_src, n_src), dtype=np.complex128)
+            B_inv = np.zeros((n_src, n_src), dtype=np.complex128)
+            w = np.zeros(n_chan, dtype=np.complex128)
+            a = np.zeros(n_chan, dtype=np.complex128)
+            d = np.zeros(n_chan, dtype=np.complex128)
+            v = np.zeros((3, n_src), dtype=np.complex128)
+            if n_src < n_chan:
+                _orth_const(C, W, n_src, CxW, G_inv, B_inv)
+
+            for s in range(n_src):
+                for k in range(n_tri):
+                    V[triu0[k], triu1[k]] = tri[s, f, k]
+                    V[triu1[k], triu0[k]] = np.conj(tri[s, f, k])
+
+                if n_src < n_chan:
+                    # solves V_s x = a_s, a_s = Cx W (W^H Cx W)^{-1} e_s, by
+                    # the Cholesky factorization of V_s if possible
+                    for i in range(n_chan):
+                        acc = 0j
+                        for j in range(n_src):
+                            acc += CxW[i, j] * G_inv[j, s]
+                        x[i, 0] = acc
+                        a[i] = acc
+                        for j in range(n_chan):
+                            M[i, j] = V[i, j]
+                    if not _cho_solve(M, x[:, 0]):
+                        for i in range(n_chan):
+                            x[i, 0] = a[i]
+                            for j in range(n_chan):
+                                M[i, j] = V[i, j]
+                        _solve(M, x)
+
+                else:
+                    # solves (W_hat^H V_s) x = e_s
+                    for i in range(n_chan):
+                        x[i, 0] = 0.0
+                        for j in range(n_chan):
+                            acc = 0j
+                            for k in range(n_chan):
+                                acc += np.conj(W[k, i]) * V[k, j]
+                            M[i, j] = acc
+                    x[s, 0] = 1.0
+                    _solve(M, x)
+
+                # normalize, the update is rejected when the rounding errors
+                # make the norm non-positive or the vector not finite
+                denom = 0.0
+                for i in range(n_chan):
+                    acc = 0j
+                    for j in range(n_chan):
+                        acc += V[i, j] * x[j, 0]
+                    denom += (np.conj(x[i, 0]) * acc).real
+                if not (np.isfinite(denom) and denom > 0.0):
+                    continue
+                denom = np.sqrt(denom)
+                for i in range(n_chan):
+                    w[i] = x[i, 0] / denom
+
+                if n_src < n_chan:
+                    _orth_update(C, W, n_src, s, w, CxW, G_inv, B_inv, d, v)
+                else:
+                    for i in range(n_chan):
+                        W[i, s] = w[i]
+
+            for i in range(n_chan):
+                for j in range(n_chan):
+                    W_hat[f, i, j] = W[i, j]
+
+    @numba.njit(parallel=True, cache=True, fastmath=True)
+    def ogive_update(
+        X, Y, r_inv, w, a, delta, lambda_a, Cx, Cx_inv, I_w, I_a, mu, mu_min, mu_max
+    ):
+        """
+        The w-steps and a-steps of OGIVE on the bins selected by ``I_w`` and
+        ``I_a``, followed by the orthogonal constraints. The score function
+        and its products with the input and output are accumulated in double
+        precision. The step sizes are adapted with the short step rule of
+        Barzilai and Borwein within ``[mu_min, mu_max]``, they are fixed when
+        the bounds are equal.
+
+        Parameters
+        ----------
+        X: ndarray (n_freq, n_frames, n_chan)
+            The input
+        Y: ndarray (n_freq, n_frames, 1)
+            The output
+        r_inv: ndarray (n_frames, 1)
+            The inverse of the auxiliary variables
+        w, a, delta: ndarray (n_freq, n_chan, 1)
+            The demixing and mixing vectors, and the last steps, updated in
+            place
+        mu: ndarray (n_freq, 1, 1)
+            The step sizes, updated in place
+        lambda_a: ndarray (n_freq, 1, 1)
+            The normalizations of the demixing vectors, updated in place
+        Cx, Cx_inv: ndarray (n_freq, n_chan, n_chan)
+            The covariance matrices of the input and their inverses
+        I_w, I_a: ndarray (n_freq,) of bool
+            The bins of the w-steps and of the a-steps
+        mu_min, mu_max: float
+            The bounds of the step sizes
+        """
+
+        n_freq, n_frames, n_chan = X.shape
+
+        for f in numba.prange(n_freq):
+
+            # "Nu" in Algo 3 of [1] and the product of the input and score
+            # function psi = r_inv * conj(y), in real arithmetic
+            zeta = 0.0
+            x_re = np.zeros(n_chan)
+            x_im = np.zeros(n_chan)
+            for t in range(n_frames):
+                y = Y[f, t, 0]
+                p_re = r_inv[t, 0] * y.real
+                p_im = -r_inv[t, 0] * y.imag
+                zeta += y.real * p_re - y.imag * p_im
+                for c in range(n_chan):
+                    x = X[f, t, c]
+                    x_re[c] += x.real * p_re - x.imag * p_im
+                    x_im[c] += x.real * p_im + x.imag * p_re
+            x_psi = (x_re + 1j * x_im) / zeta
+
+            v = np.zeros(n_chan, dtype=np.complex128)
+
+            # the new step, in w or in a
+            d = np.zeros(n_chan, dtype=np.complex128)
+            if I_w[f]:
+                for c in range(n_chan):
+                    d[c] = a[f, c, 0] - x_psi[c]
+            if I_a[f]:
+                for i in range(n_chan):
+                    acc = 0j
+                    for j in range(n_chan):
+                        acc += Cx_inv[f, i, j] * x_psi[j]
+                    d[i] = w[f, i, 0] - acc * lambda_a[f, 0, 0]
+
+            # the short step size of Barzilai and Borwein, from the last move
+            # and the change of the step
+            diff_norm, curv = 0.0, 0.0
+            for c in range(n_chan):
+                d_prev = np.complex128(delta[f, c, 0])
+                diff = d_prev - d[c]
+                diff_norm += diff.real ** 2 + diff.imag ** 2
+                curv += (np.conj(d_prev) * diff).real
+            if curv > 0.0:
+                mu[f, 0, 0] = min(max(mu[f, 0, 0] * curv / diff_norm, mu_min), mu_max)
+            else:
+                mu[f, 0, 0] = min(max(mu[f, 0, 0], mu_min), mu_max)
+
+            for c in range(n_chan):
+                delta[f, c, 0] = d[c]
+
+            if I_w[f]:
+                for c in range(n_chan):
+                    w[f, c, 0] += mu[f, 0, 0] * delta[f, c, 0]
+
+                # a from w
+                lambda_w = 0.0
+                for i in range(n_chan):
+                    acc = 0j
+                    for j in range(n_chan):
+                        acc += Cx[f, i, j] * w[f, j, 0]
+                    v[i] = acc
+                    lambda_w += (np.conj(np.complex128(w[f, i, 0])) * acc).real
+                for i in range(n_chan):
+                    a[f, i, 0] = v[i] / lambda_w
+
+            if I_a[f]:
+                for c in range(n_chan):
+                    a[f, c, 0] += mu[f, 0, 0] * delta[f, c, 0]
+
+            # w from a, the normalization is computed for all the bins
+            lmb = 0.0
+            for i in range(n_chan):
+                acc = 0j
+                for j in range(n_chan):
+                    acc += Cx_inv[f, i, j] * a[f, j, 0]
+                v[i] = acc
+                lmb += (np.conj(np.complex128(a[f, i, 0])) * acc).real
+            lambda_a[f, 0, 0] = 1.0 / lmb
+
+            if I_a[f]:
+                for i in range(n_chan):
+                    w[f, i, 0] = v[i] / lmb
+
+    @numba.njit(parallel=True, cache=True, fastmath=True)
+    def weighted_covariance(X, weights, triu0, triu1, tri, index):
+        """
+        The upper triangular parts of the weighted covariance matrices of all
+        the sources, in a single pass over the input of every bin
+
+        Parameters
+        ----------
+        X: ndarray (n_frames, n_freq, n_chan)
+            The input
+        weights: ndarray (n_src, n_frames)
+            The weights of the frames, already divided by the number of frames
+        triu0, triu1: ndarray (n_tri,)
+            The row and column indices of the upper triangular parts
+        tri: ndarray (n_src, n_freq, n_tri)
+            The output
+        index: ndarray of int
+            The bins to compute
+        """
+
+        n_frames, n_chan = X.shape[0], X.shape[2]
+        n_src, n_tri = weights.shape[0], triu0.shape[0]
+
+        for i_f in numba.prange(index.shape[0]):
+            f = index[i_f]
+
+            # the real and imaginary parts of the channels of the bin
+            x_re = np.empty((n_chan, n_frames), dtype=weights.dtype)
+            x_im = np.empty((n_chan, n_frames), dtype=weights.dtype)
+            for t in range(n_frames):
+                for c in range(n_chan):
+                    x_re[c, t] = X[t, f, c].real
+                    x_im[c, t] = X[t, f, c].imag
+
+            for k in range(n_tri):
+                a_re, a_im = x_re[triu0[k]], x_im[triu0[k]]
+                b_re, b_im = x_re[triu1[k]], x_im[triu1[k]]
+                for s in range(n_src):
+                    w = weights[s]
+                    acc_re = 0.0
+                    acc_im = 0.0
+                    for t in range(n_frames):
+                        acc_re += w[t] * (a_re[t] * b_re[t] + a_im[t] * b_im[t])
+                        acc_im += w[t] * (a_im[t] * b_re[t] - a_re[t] * b_im[t])
+                    tri[s, f, k] = acc_re + 1j * acc_im
@@ -0,0 +1,261 @@
+# Copyright (c) 2019 Robin Scheibler
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+Overdetermined independent low-rank matrix analysis (ILRMA). The variances of
+the sources are modeled by non-negative matrix factorizations as in ILRMA,
+and the demixing matrices are parametrized as in overdetermined IVA, with
+the orthogonal constraint on the background subspace.
+"""
+import numpy as np
+
+from pyroomacoustics.bss import projection_back
+
+from covariance import IterativeProjection, normalize, principal_subspace
+
+
+def overilrma(
+    X,
+    n_src=None,
+    n_iter=20,
+    proj_back=True,
+    W0=None,
+    n_components=2,
+    init_eig=False,
+    seed=None,
+    return_filters=False,
+    return_info=False,
+    callback=None,
+    callback_period=10,
+):
+
+    """
+    Overdetermined ILRMA. Only ``n_src`` demixing vectors and ``n_src``
+    non-negative matrix factorizations are estimated, the background
+    subspace being given by the orthogonal constraint of
+    :py:func:`overiva.overiva`. When ``n_src==nchannels``, the algorithm is
+    identical to ILRMA.
+
+    D. Kitamura, N. Ono, H. Sawada, H. Kameoka, H. Saruwatari, *Determined blind
+    source separation unifying independent vector analysis and nonnegative matrix
+    factorization,* IEEE/ACM Trans. ASLP, vol. 24, no. 9, pp. 1626-1641, Sept. 2016
+
+    R. Scheibler and N. Ono, Independent Vector Analysis with more Microphones than Sources, arXiv, 2019.
+    https://arxiv.org/abs/1905.07880
+
+    Parameters
+    ----------
+    X: ndarray (nframes, nfrequencies, nchannels)
+        STFT representation of the signal
+    n_src: int, optional
+        The number of sources or independent components. Defaults to
+        ``nchannels``
+    n_iter: int, optional
+        The number of iterations (default 20)
+    proj_back: bool, optional
+        Scaling on first mic by back projection (default True)
+    W0: ndarray (nfrequencies, nchannels, nsrc), optional
+        Initial value for demixing matrix
+    n_components: int, optional
+        The number of components of the non-negative matrix factorizations
+        of the variances of the sources (default 2)
+    init_eig: bool, optional (default ``False``)
+        If ``True``, and if ``W0 is None``, then the weights are initialized
+        using the principal eigenvectors of the covariance matrix of the input
+        data.
+    seed: int or numpy.random.Generator, optional
+        Seed of the random initialization of the non-negative matrix
+        factorizations
+    return_filters: bool
+        If true, the function will return the demixing matrix too
+    return_info: bool
+        If true, the function will also return a dictionary containing the
+        number of iterations run (``n_iter``) and the value of the cost at
+        every iteration (``cost``)
+    callback: func
+        A callback function called with the separated signals every
+        ``callback_period`` iterations, allows to monitor convergence
+    callback_period: int, optional
+        The number of iterations between the calls of the callback (default 10)
+
+    Returns
+    -------
+    Returns an (nframes, nfrequencies, nsources) array. Also returns
+    the demixing matrix (nfrequencies, nchannels, nsources)
+    if ``return_filters`` keyword is True, and the info dictionary
+    if ``return_info`` is True.
+
+    The cost is the negative log-likelihood of the model divided by the number
+    of frames, up to a constant,
+
+        -2 sum_f log|det W_hat[f]| + 1 / nframes * sum_s sum_f sum_t (|y[f, t, s]|^2 / r[s, f, t] + log r[s, f, t])
+
+    where r[s] = T[s] H[s]^T is the low-rank variance of source s. It is
+    evaluated at the beginning of every iteration.
+    """
+
+    n_frames, n_freq, n_chan = X.shape
+
+    # default to determined case
+    if n_src is None:
+        n_src = n_chan
+
+    # Things are more efficient when the frequencies are over the first axis
+    # shape (n_freq, n_frames, n_chan)
+    X_f = X.swapaxes(0, 1).copy()
+
+    # the covariance matrices are accumulated in double precision even for a
+    # single precision input, the low frequencies are ill-conditioned
+    X_d = X_f.astype(np.complex128, copy=False)
+    X_d_conj = np.conj(X_d)
+
+    # covariance matrix of input signal (n_freq, n_chan, n_chan)
+    Cx = (X_d.swapaxes(1, 2) @ X_d_conj) / n_frames
+
+    W_hat = np.zeros((n_freq, n_chan, n_chan), dtype=X.dtype)
+    W = W_hat[:, :, :n_src]
+    J = W_hat[:, :n_src, n_src:]
+
+    def tensor_H(T):
+        return np.conj(T).swapaxes(1, 2)
+
+    def update_J_from_orth_const():
+        tmp = np.matmul(tensor_H(W), Cx)
+        J[:, :, :] = np.linalg.solve(tmp[:, :, :n_src], tmp[:, :, n_src:])
+
+    # initialize A and W
+    if W0 is None:
+
+        if init_eig:
+            # Initialize the demixing matrices with the principal
+            # eigenvectors of the input covariance
+            _, w = principal_subspace(Cx, n_src)
+            W[:, :, :] = np.conj(w)
+
+        else:
+            # Or with identity
+            W[:, :n_src, :] = np.eye(n_src)
+
+    else:
+        W[:, :, :] = W0
+
+    # We still need to initialize the rest of the matrix
+    if n_src < n_chan:
+        update_J_from_orth_const()
+        W_hat[:, n_src:, n_src:] = -np.eye(n_chan - n_src)
+
+    eps = 1e-15
+
+    # initialize the non-negative matrices with random values, the variance
+    # of source s is R[s] = T[s] H[s]^T, shape (n_src, n_freq, n_frames)
+    rng = np.random.default_rng(seed)
+    T = 0.1 + 0.9 * rng.random((n_src, n_freq, n_components))
+    H = 0.1 + 0.9 * rng.random((n_src, n_frames, n_components))
+    R = T @ H.swapaxes(1, 2)
+
+    Y = np.zeros((n_freq, n_frames, n_src), dtype=X.dtype)
+
+    # Compute the demixed output and its power, shape (n_src, n_freq, n_frames)
+    def demix(Y, X, W):
+        Y[:, :, :] = X @ np.conj(W)
+        return np.abs(Y.transpose([2, 0, 1])) ** 2
+
+    # the callback gets the frames-major output
+    def run_callback(Y):
+        Y_tmp = Y.swapaxes(0, 1)
+        if proj_back:
+            z = projection_back(Y_tmp, X[:, :, 0])
+            Y_tmp = Y_tmp * np.conj(z[None, :, :])
+        callback(Y_tmp)
+
+    def update_nmf(T, H, P, R):
+        # multiplicative updates of the bases and activations of all the
+        # sources at once
+        iR = 1.0 / R
+        T *= np.sqrt(((P * iR ** 2) @ H) / (iR @ H))
+        T[T < eps] = eps
+
+        R[:, :, :] = T @ H.swapaxes(1, 2)
+        R[R < eps] = eps
+        iR = 1.0 / R
+
+        H *= np.sqrt(
+            ((P * iR ** 2).swapaxes(1, 2) @ T) / (iR.swapaxes(1, 2) @ T)
+        )
+        H[H < eps] = eps
+
+        R[:, :, :] = T @ H.swapaxes(1, 2)
+        R[R < eps] = eps
+
+    # the trace of the cost
+    cost = np.zeros(n_iter)
+
+    P = demix(Y, X_f, W)
+
+    for epoch in range(n_iter):
+
+        if callback is not None and epoch % callback_period == 0:
+            run_callback(Y)
+
+        cost[epoch] = np.sum(P / R + np.log(R)) / n_frames
+        cost[epoch] -= 2.0 * np.sum(np.linalg.slogdet(W_hat)[1])
+
+        update_nmf(T, H, P, R)
+
+        # the IP updates, with the orthogonal constraints in the overdetermined
+        # case, see :py:class:`covariance.IterativeProjection`
+        ip = IterativeProjection(W_hat, Cx, n_src)
+
+        for s in range(n_src):
+            # Compute the Auxiliary Variable, the weights depend on the
+            # frequency, shape: (n_freq, n_chan, n_chan)
+            V_s = (X_d * (1.0 / R[s, :, :, None])).swapaxes(1, 2) @ X_d_conj
+            V_s /= n_frames
+
+            w = ip.project(V_s, [s])[:, :, 0]
+            ip.update(s, normalize(w, V_s, W[:, :, s]))
+
+        P = demix(Y, X_f, W)
+
+        # fix the scale of the outputs, shape (n_src,)
+        lambda_aux = 1.0 / np.sqrt(np.mean(P, axis=(1, 2)))
+        W *= lambda_aux[None, None, :]
+        Y *= lambda_aux[None, None, :]
+        P *= lambda_aux[:, None, None] ** 2
+        R *= lambda_aux[:, None, None] ** 2
+        T *= lambda_aux[:, None, None] ** 2
+
+    Y = Y.swapaxes(0, 1).copy()
+
+    if proj_back:
+        z = projection_back(Y, X[:, :, 0])
+        Y *= np.conj(z[None, :, :])
+
+    ret = (Y,)
+
+    if return_filters:
+        ret += (W,)
+
+    if return_info:
+        ret += ({"n_iter": n_iter, "cost": cost},)
+
+    if len(ret) == 1:
+        return Y
+    else:
+        return ret
@@ -24,6 +24,110 @@ import numpy as np
 
 from pyroomacoustics.bss import projection_back
 
+import kernels
+from covariance import (
+    IterativeProjection,
+    WeightedCovariance,
+    normalize,
+    principal_subspace,
+)
+from parallel import CallbackWorker, FrequencyBlocks
+from source_models import get_model
+
+
+def _gev_2x2(U_m, U_n):
+    """
+    Solves the generalized eigenvalue problem ``U_m c = lambda U_n c`` for
+    stacks of 2x2 Hermitian positive definite matrices, in closed form.
+
+    Returns the eigenvectors of the largest and of the smallest eigenvalues,
+    normalized so that ``c_m^H U_m c_m = 1`` and ``c_n^H U_n c_n = 1``. These
+    are the updates of a pair of demixing vectors in the IP2 rule.
+
+    Parameters
+    ----------
+    U_m, U_n: ndarray (..., 2, 2)
+        The two stacks of matrices
+
+    Returns
+    -------
+    Two arrays of shape (..., 2, 1)
+    """
+
+    # the computations are always carried out in double precision
+    dtype = U_m.dtype
+    U_m = U_m.astype(np.complex128)
+    U_n = U_n.astype(np.complex128)
+
+    # coefficients of det(U_m - lambda U_n) = a lambda^2 + b lambda + c
+    a = np.real(U_n[..., 0, 0] * U_n[..., 1, 1]) - np.abs(U_n[..., 0, 1]) ** 2
+    b = 2 * np.real(U_m[..., 0, 1] * np.conj(U_n[..., 0, 1])) - np.real(
+        U_m[..., 0, 0] * U_n[..., 1, 1] + U_m[..., 1, 1] * U_n[..., 0, 0]
+    )
+    c = np.real(U_m[..., 0, 0] * U_m[..., 1, 1]) - np.abs(U_m[..., 0, 1]) ** 2
+
+    # the largest eigenvalue
+    lmb = (-b + np.sqrt(np.maximum(b ** 2 - 4 * a * c, 0.0))) / (2 * a)
+
+    # null vector of the (rank one) matrix M = U_m - lambda U_n, taken from
+    # the row with the largest diagonal element for stability
+    M = U_m - lmb[..., None, None] * U_n
+    use_first = np.abs(M[..., 0, 0]) >= np.abs(M[..., 1, 1])
+    c_m = np.where(
+        use_first[..., None],
+        np.stack([M[..., 0, 1], -M[..., 0, 0]], axis=-1),
+        np.stack([M[..., 1, 1], -M[..., 1, 0]], axis=-1),
+    )[..., None]
+
+    # when the two matrices are proportional, any vector is a solution
+    degenerate = np.linalg.norm(c_m, axis=(-2, -1)) == 0.0
+    c_m[degenerate, 0, 0] = 1.0
+
+    # the other eigenvector is orthogonal to U_m c_m
+    v = U_m @ c_m
+    c_n = np.stack([-np.conj(v[..., 1, :]), np.conj(v[..., 0, :])], axis=-2)
+
+    # normalize
+    c_m /= np.sqrt(np.real(np.conj(c_m.swapaxes(-2, -1)) @ U_m @ c_m))
+    c_n /= np.sqrt(np.real(np.conj(c_n.swapaxes(-2, -1)) @ U_n @ c_n))
+
+    return c_m.astype(dtype), c_n.astype(dtype)
+
+
+def _buffer(workspace, name, shape, dtype):
+    """
+    Returns the array ``name`` of the workspace dictionary, it is only
+    allocated when missing, or of a different shape or type. The content of a
+    reused array is that left by the previous call. Without a workspace, a new
+    array is allocated.
+    """
+
+    if workspace is None:
+        return np.zeros(shape, dtype=dtype)
+
+    arr = workspace.get(name)
+    if arr is None or arr.shape != shape or arr.dtype != dtype:
+        arr = workspace[name] = np.zeros(shape, dtype=dtype)
+
+    return arr
+
+
+def _pairs(n_src, update):
+    """
+    The pairs of sources updated together by IP2, when the number of sources
+    is odd, the last one is paired with the first one. Returns None for IP.
+    """
+
+    if update == "ip2" and n_src > 1:
+        pairs = [(s, s + 1) for s in range(0, n_src - 1, 2)]
+        if n_src % 2 == 1:
+            pairs.append((n_src - 1, 0))
+        return pairs
+    elif update in ["ip", "ip2"]:
+        return None
+    else:
+        raise ValueError("Unknown update rule {}".format(update))
+
 
 def overiva(
     X,
@@ -33,8 +137,19 @@ def overiva(
     W0=None,
     model="laplace",
     init_eig=False,
+    update="ip",
+    tol=None,
     return_filters=False,
+    return_info=False,
     callback=None,
+    callback_period=10,
+    callback_async=False,
+    callback_queue=2,
+    n_jobs=None,
+    workspace=None,
+    layout="frames",
+    backend="numpy",
+    accel=None,
 ):
 
     """
@@ -47,7 +162,8 @@ def overiva(
     Parameters
     ----------
     X: ndarray (nframes, nfrequencies, nchannels)
-        STFT representation of the signal
+        STFT representation of the signal, or (nfrequencies, nframes,
+        nchannels) if ``layout`` is 'freq'
     n_src: int, optional
         The number of sources or independent components. When
         ``n_src==nchannels``, the algorithms is identical to AuxIVA. When
@@ -58,44 +174,150 @@ def overiva(
         Scaling on first mic by back projection (default True)
     W0: ndarray (nfrequencies, nsrc, nchannels), optional
         Initial value for demixing matrix
-    model: str
-        The model of source distribution 'gauss' or 'laplace' (default)
+    model: str or SourceModel
+        The model of source distribution, the name of a model of the
+        registry of :py:mod:`source_models`, e.g., 'gauss' or 'laplace'
+        (default), or a model object
     init_eig: bool, optional (default ``False``)
         If ``True``, and if ``W0 is None``, then the weights are initialized
         using the principal eigenvectors of the covariance matrix of the input
         data.
+    update: str, optional
+        The update rule of the demixing matrix, either 'ip' (default) for
+        the iterative projection of one source at a time, or 'ip2' to update
+        the demixing vectors of pairs of sources jointly
+    tol: float, optional
+        If provided, a frequency bin is frozen once the relative change of its
+        demixing matrix over one iteration is smaller than ``tol``, and the
+        following iterations only update the remaining bins. The algorithm
+        stops when all the bins are frozen, or after ``n_iter`` iterations.
     return_filters: bool
         If true, the function will return the demixing matrix too
+    return_info: bool
+        If true, the function will also return a dictionary containing the
+        number of iterations run (``n_iter``), the number of frequency bins
+        updated at every iteration (``n_active``), and the value of the
+        surrogate cost at every iteration (``cost``)
     callback: func
-        A callback function called every 10 iterations, allows to monitor
-        convergence
+        A callback function called with the separated signals every
+        ``callback_period`` iterations, allows to monitor convergence
+    callback_period: int, optional
+        The number of iterations between the calls of the callback (default 10)
+    callback_async: bool, optional
+        If true, the callback is run in a background thread. The loop only
+        hands over a copy of the demixing matrices, and the demixing, the
+        projection back, and the callback are done by the thread (see
+        :py:class:`parallel.CallbackWorker`). The pending calls are dropped,
+        oldest first, when the thread lags behind, so that the monitoring
+        never stalls the separation.
+    callback_queue: int, optional
+        The maximum number of pending calls of the asynchronous callback
+        (default 2)
+    n_jobs: int, optional
+        If provided, the frequency bins are split in ``n_jobs`` blocks that
+        are updated by a pool of threads, -1 uses all the CPUs (see
+        :py:class:`parallel.FrequencyBlocks`). The threads only synchronize
+        for the computation of the auxiliary variables, and the result is the
+        same as with one job.
+    workspace: dict, optional
+        If provided, the work arrays are stored in this dictionary and reused
+        by the following calls with inputs of the same shape, instead of
+        being allocated every time. The demixing matrix returned is then a
+        view in the workspace (see :py:class:`OverIVA`).
+    layout: str, optional
+        The layout of the input, the output, and the signals passed to the
+        callback, either 'frames' (default) for frames-major arrays, or
+        'freq' for frequency-major arrays. The algorithm works on
+        frequency-major arrays, so that the 'freq' layout avoids the
+        transposed copies of the input and output.
+    backend: str, optional
+        The implementation of the weighted covariance matrices and of the IP
+        updates, either 'numpy' (default), or 'numba' for compiled kernels
+        that process every frequency bin in a single fused loop, the bins
+        being processed in parallel by the threads of numba (see
+        :py:mod:`kernels`). The numpy implementation is used when numba is
+        not installed, and for the IP updates of the 'ip2' rule.
+    accel: str, optional
+        If 'squarem', the convergence is accelerated by extrapolating the
+        demixing matrices from the last three iterates, every two iterations,
+        with the steplength of SQUAREM (R. Varadhan and C. Roland, Simple and
+        globally convergent methods for accelerating the convergence of any
+        EM algorithm, Scand. J. Statist., 2008). The extrapolation is only
+        kept if it decreases the cost at the same scale of the sources as the
+        last iterate, which costs one more demixing per two iterations, and
+        one more again when it is rejected. The frozen bins are not
+        extrapolated.
 
     Returns
     -------
-    Returns an (nframes, nfrequencies, nsources) array. Also returns
+    Returns an (nframes, nfrequencies, nsources) array, or (nfrequencies,
+    nframes, nsources) if ``layout`` is 'freq'. Also returns
     the demixing matrix (nfrequencies, nchannels, nsources)
-    if ``return_values`` keyword is True.
+    if ``return_values`` keyword is True, and the info dictionary
+    if ``return_info`` is True.
+
+    The cost is the negative log-likelihood of the model divided by the number
+    of frames, up to a constant,
+
+        -2 sum_f log|det W_hat[f]| + 1 / nframes * sum_t sum_s G(y[t, s])
+            + sum_f log det(Z[f]^H Cx[f] Z[f])
+
+    where G is the contrast function of the source model, e.g., G(y) = ||y||
+    for 'laplace' and G(y) = nfrequencies * log ||y||^2 for 'gauss', y being
+    the vector of a source over all the frequencies. The last term is that of
+    the background in the overdetermined case, Z being the last ``nchannels -
+    nsources`` columns of W_hat and Cx the covariance of the input. The cost
+    decreases monotonically with the iterations for all the models. It is
+    evaluated with the auxiliary variables at the beginning of every
+    iteration so that it costs only one or two log-determinants per
+    frequency.
     """
 
-    n_frames, n_freq, n_chan = X.shape
+    if layout == "frames":
+        n_frames, n_freq, n_chan = X.shape
+    elif layout == "freq":
+        n_freq, n_frames, n_chan = X.shape
+        X = X.swapaxes(0, 1)
+    else:
+        raise ValueError("Unknown layout {}".format(layout))
+
+    if accel not in [None, "squarem"]:
+        raise ValueError("Unknown acceleration {}".format(accel))
 
     # default to determined case
     if n_src is None:
         n_src = n_chan
 
-    # covariance matrix of input signal (n_freq, n_chan, n_chan)
-    Cx = np.mean(X[:, :, :, None] * np.conj(X[:, :, None, :]), axis=0)
+    source_model = get_model(model)
 
-    W_hat = np.zeros((n_freq, n_chan, n_chan), dtype=X.dtype)
+    # the frequency bins are processed by blocks, possibly in parallel
+    pool = FrequencyBlocks(n_freq, n_jobs)
+
+    # computes the auxiliary variables of all sources in one pass per block
+    covs = pool.map(
+        lambda b, F: WeightedCovariance(
+            X[:, F], n_src, max_bytes=2 ** 26 // len(pool), backend=backend
+        )
+    )
+
+    # covariance matrix of input signal (n_freq, n_chan, n_chan), it is kept
+    # in double precision, as the weighted covariance matrices, so that the
+    # updates of the demixing matrices are solved in double precision even
+    # for a single precision input, the low frequencies are ill-conditioned
+    Cx = _buffer(workspace, "Cx", (n_freq, n_chan, n_chan), np.complex128)
+    pool.map(lambda b, F: covs[b].covariance(out=Cx[F]))
+
+    W_hat = _buffer(workspace, "W_hat", (n_freq, n_chan, n_chan), X.dtype)
+    W_hat[:, :, :] = 0.0
     W = W_hat[:, :, :n_src]
     J = W_hat[:, :n_src, n_src:]
 
     def tensor_H(T):
         return np.conj(T).swapaxes(1, 2)
 
-    def update_J_from_orth_const():
-        tmp = np.matmul(tensor_H(W), Cx)
-        J[:, :, :] = np.linalg.solve(tmp[:, :, :n_src], tmp[:, :, n_src:])
+    def update_J_from_orth_const(F=slice(None), I=slice(None)):
+        tmp = np.matmul(tensor_H(W[F][I]), Cx[F][I])
+        J[F][I] = np.linalg.solve(tmp[:, :, :n_src], tmp[:, :, n_src:])
 
     # initialize A and W
     if W0 is None:
@@ -103,10 +325,8 @@ def overiva(
         if init_eig:
             # Initialize the demixing matrices with the principal
             # eigenvectors of the input covariance
-            v, w = np.linalg.eig(Cx)
-            for f in range(n_freq):
-                ind = np.argsort(v[f])[-n_src:]
-                W[f, :, :] = np.conj(w[f][:, ind])
+            _, w = principal_subspace(Cx, n_src)
+            W[:, :, :] = np.conj(w)
 
         else:
             # Or with identity
@@ -122,49 +342,231 @@ def overiva(
         for f in range(n_freq):
             W_hat[f, n_src:, n_src:] = -np.eye(n_chan - n_src)
 
-    eyes = np.tile(np.eye(n_chan, n_chan), (n_freq, 1, 1))
-    V = np.zeros((n_freq, n_chan, n_chan), dtype=X.dtype)
-    r_inv = np.zeros((n_frames, n_src))
-    r = np.zeros((n_frames, n_src))
+    V = _buffer(workspace, "V", (n_freq, n_chan, n_chan), np.complex128)
+
+    # the pairs of sources updated together by IP2
+    pairs = _pairs(n_src, update)
 
-    # Things are more efficient when the frequencies are over the first axis
-    Y = np.zeros((n_freq, n_frames, n_src), dtype=X.dtype)
-    X = X.swapaxes(0, 1).copy()
+    r_inv = _buffer(workspace, "r_inv", (n_frames, n_src), X.real.dtype)
+    r = _buffer(workspace, "r", (n_frames, n_src), X.real.dtype)
+
+    # Things are more efficient when the frequencies are over the first axis,
+    # in the 'freq' layout, the output is returned without copy
+    if layout == "frames":
+        Y = _buffer(workspace, "Y", (n_freq, n_frames, n_src), X.dtype)
+        X_f = _buffer(workspace, "X", (n_freq, n_frames, n_chan), X.dtype)
+        X_f[:, :, :] = X.swapaxes(0, 1)
+        X = X_f
+    else:
+        Y = np.zeros((n_freq, n_frames, n_src), dtype=X.dtype)
+        X = X.swapaxes(0, 1)
 
     # Compute the demixed output
-    def demix(Y, X, W):
-        Y[:, :, :] = X @ np.conj(W)
+    def demix(Y, X, W, I=slice(None)):
+        Y[I] = X[I] @ np.conj(W[I])
 
-    for epoch in range(n_iter):
+    # the callback gets the frequency-major output, before projection back
+    def run_callback(Y):
+        Y_tmp = Y.swapaxes(0, 1)
+        if proj_back:
+            z = projection_back(Y_tmp, X[:, :, 0].swapaxes(0, 1))
+            Y_tmp = Y_tmp * np.conj(z[None, :, :])
+        callback(Y_tmp if layout == "frames" else Y_tmp.swapaxes(0, 1))
+
+    # or the demixing matrices, to be applied in the background
+    if callback is not None and callback_async:
+        worker = CallbackWorker(
+            lambda W_snap: run_callback(X @ np.conj(W_snap)), max_queue=callback_queue
+        )
+    else:
+        worker = None
+
+    # the frequency bins that are still updated
+    active = np.ones(n_freq, dtype=bool)
+    n_active = np.zeros(n_iter, dtype=int)
+
+    # the trace of the surrogate cost
+    cost = np.zeros(n_iter)
+
+    if tol is not None:
+        W_prev = W.copy()
+
+    # index of the active bins of every block
+    index = [slice(None)] * len(pool)
+
+    # the compiled kernels take the indices of the bins to update
+    compiled = kernels.use_numba(backend) and pairs is None
+    bins = [np.arange(F.stop - F.start) for F in pool.blocks]
+
+    def demix_block(b, F):
+        # returns the squared norms of the output of the block
+        demix(Y[F], X[F], W[F], index[b])
+        return np.sum(np.abs(Y[F]) ** 2, axis=0)
+
+    def freeze_block(F, I):
+        # freeze the bins that have converged, the demixing matrices are
+        # compared after the update, where their scale is fixed
+        if tol is not None:
+            W_new = W[F][I]
+            W_prev_b = W_prev[F]
+            delta = np.linalg.norm(W_new - W_prev_b[I], axis=(1, 2))
+            active_b = active[F]
+            active_b[active_b] = delta >= tol * np.linalg.norm(W_prev_b[I], axis=(1, 2))
+            W_prev_b[I] = W_new
+
+    def evaluate(norms):
+        # the auxiliary variables, shape: (n_frames, n_src), and the cost of
+        # the current demixing matrices
+        cost = source_model.auxiliary(norms, n_freq, r) / n_frames
+        if n_src < n_chan:
+            # the stationary Gaussian background, its covariance replaced by
+            # its maximum likelihood estimate
+            Z = W_hat[:, :, n_src:]
+            cost += np.sum(np.linalg.slogdet(tensor_H(Z) @ Cx @ Z)[1])
+        return cost - 2.0 * np.sum(np.linalg.slogdet(W_hat)[1], dtype=np.float64)
+
+    # the last iterates, at the beginning of the iterations
+    W_iterates = []
+
+    def extrapolate(norms, cost):
+        # SQUAREM step from the last three iterates, returns the squared
+        # norms of the output and the cost of the iterate that is kept
+        W_0, W_1 = W_iterates
+        W_2 = W.copy()
+        del W_iterates[:]
 
+        d_1 = (W_1 - W_0)[active]
+        d_2 = (W_2 - 2.0 * W_1 + W_0)[active]
+        norm_d_2 = np.linalg.norm(d_2)
+        if norm_d_2 == 0.0:
+            return norms, cost
+
+        alpha = min(-np.linalg.norm(d_1) / norm_d_2, -1.0)
+        W[active] = W_0[active] - 2.0 * alpha * d_1 + alpha ** 2 * d_2
+
+        if source_model.degree is not None:
+            gamma = r.mean(axis=0)
+
+        try:
+            if n_src < n_chan:
+                update_J_from_orth_const()
+            norms_ex = sum(pool.map(demix_block))
+            cost_ex = evaluate(norms_ex)
+
+            # the cost is only compared at the scale of the last iterate,
+            # the extrapolation could otherwise decrease it by only changing
+            # the scale, that the next iterations would restore
+            if source_model.degree is not None:
+                scale = source_model.scale(r.mean(axis=0) / gamma)
+                W[:, :, :] /= scale[None, None, :]
+                Y[:, :, :] /= scale[None, None, :]
+                norms_ex /= scale[None, :] ** 2
+                cost_ex = evaluate(norms_ex)
+        except np.linalg.LinAlgError:
+            cost_ex = np.inf
+
+        if cost_ex < cost:
+            return norms_ex, cost_ex
+
+        # otherwise, go back to the last iterate
+        W[:, :, :] = W_2
+        if n_src < n_chan:
+            update_J_from_orth_const()
         demix(Y, X, W)
+        norms = np.sum(np.abs(Y) ** 2, axis=0)
+        return norms, evaluate(norms)
 
-        if callback is not None and epoch % 10 == 0:
-            Y_tmp = Y.swapaxes(0, 1)
-            if proj_back:
-                z = projection_back(Y_tmp, X[:, :, 0].swapaxes(0, 1))
-                callback(Y_tmp * np.conj(z[None, :, :]))
+    def update_block(b, F):
+        I = index[b]
+        W_hat_b, V_b, active_b = W_hat[F], V[F], active[F]
+
+        # the output of the block is rescaled with the demixing matrices
+        if source_model.degree is not None:
+            Y[F] /= scale
+
+        # Compute the Auxiliary Variables of all the sources
+        covs[b].update(r_inv, active=None if isinstance(I, slice) else active_b)
+
+        # the compiled kernel does all the updates of a bin at once
+        if compiled:
+            with kernels.lock:
+                kernels.ip_update(
+                    covs[b].tri, *covs[b].triu, Cx[F], W_hat_b, n_src, bins[b][I]
+                )
+            freeze_block(F, I)
+            return
+
+        # when some bins are frozen, the demixing matrices of the active bins
+        # are a copy that is written back at the end
+        ip = IterativeProjection(W_hat_b[I], Cx[F][I], n_src)
+
+        # Update now the demixing matrix
+        if pairs is None:
+
+            for s in range(n_src):
+                # shape: (n_freq, n_chan, n_chan)
+                covs[b].expand(s, out=V_b)
+                V_s = V_b[I]
+
+                w = ip.project(V_s, [s])[:, :, 0]
+                ip.update(s, normalize(w, V_s, ip.W[:, :, s]))
+
+        else:
+
+            for m, n in pairs:
+                # The new demixing vectors of the pair live in the spaces
+                # spanned by P_s = (W_hat^H V_s)^{-1} [e_m, e_n]
+                P, U = [], []
+                for s in [m, n]:
+                    covs[b].expand(s, out=V_b)
+                    V_s = V_b[I]
+
+                    P.append(ip.project(V_s, [m, n]))
+                    U.append(np.conj(P[-1]).swapaxes(1, 2) @ V_s @ P[-1])
+
+                # shape (n_freq, 2, 1)
+                c_m, c_n = _gev_2x2(U[0], U[1])
+
+                ip.update(m, (P[0] @ c_m)[:, :, 0])
+                ip.update(n, (P[1] @ c_n)[:, :, 0])
+
+        if not isinstance(I, slice):
+            W_hat_b[I] = ip.W_hat
+
+        freeze_block(F, I)
+
+    for epoch in range(n_iter):
+
+        # index of the active bins, avoid copies when all are active
+        for b, F in enumerate(pool.blocks):
+            n_active_b = np.count_nonzero(active[F])
+            n_active[epoch] += n_active_b
+            if n_active_b == F.stop - F.start:
+                index[b] = slice(None)
             else:
-                callback(Y_tmp)
+                index[b] = np.flatnonzero(active[F])
 
-        # simple loop as a start
-        # shape: (n_frames, n_src)
-        if model == 'laplace':
-            r[:, :] = (2. * np.linalg.norm(Y, axis=0))
-        elif model == 'gauss':
-            r[:, :] = (np.linalg.norm(Y, axis=0) ** 2) / n_freq
+        norms = sum(pool.map(demix_block))
+        cost[epoch] = evaluate(norms)
+
+        if accel is not None:
+            if len(W_iterates) == 2:
+                norms, cost[epoch] = extrapolate(norms, cost[epoch])
+            W_iterates.append(W.copy())
+
+        if callback is not None and epoch % callback_period == 0:
+            if worker is None:
+                run_callback(Y)
+            else:
+                worker.submit(W.copy())
 
         # set the scale of r
-        gamma = r.mean(axis=0)
-        r /= gamma[None, :]
+        if source_model.degree is not None:
+            gamma = r.mean(axis=0)
+            r /= gamma[None, :]
 
-        if model == 'laplace':
-            Y /= gamma[None, None, :]
-            W /= gamma[None, None, :]
-        elif model == 'gauss':
-            g_sq = np.sqrt(gamma[None, None, :])
-            Y /= g_sq
-            W /= g_sq
+            scale = source_model.scale(gamma[None, None, :])
+            W /= scale
 
         # ensure some numerical stability
         eps = 1e-15
@@ -172,33 +574,788 @@ def overiva(
 
         r_inv[:, :] = 1. / r
 
-        # Update now the demixing matrix
-        for s in range(n_src):
-            # Compute Auxiliary Variable
-            # shape: (n_freq, n_chan, n_chan)
-            V[:, :, :] = (X.swapaxes(1, 2) * r_inv[None, None, :, s]) @ np.conj(X) / n_frames
+        # the blocks are independent until the next computation of r
+        pool.map(update_block)
 
-            WV = np.conj(W_hat).swapaxes(1, 2) @ V
-            W[:, :, s] = np.linalg.solve(WV, eyes[:, :, s])
+        if tol is not None and not np.any(active):
+            break
 
-            # normalize
-            denom = np.conj(W[:, None, :, s]) @ V[:, :, :] @ W[:, :, None, s]
-            W[:, :, s] /= np.sqrt(denom[:, :, 0])
+    pool.close()
 
-            # Update the mixing matrix according to orthogonal constraints
-            if n_src < n_chan:
-                update_J_from_orth_const()
+    # the pending callbacks are run before the work arrays are released
+    if worker is not None:
+        worker.close()
 
     demix(Y, X, W)
 
-    Y = Y.swapaxes(0, 1).copy()
+    # frames-major views of the input and output
     X = X.swapaxes(0, 1)
+    if layout == "frames":
+        Y = Y.swapaxes(0, 1).copy()
+        Y_t = Y
+    else:
+        Y_t = Y.swapaxes(0, 1)
 
     if proj_back:
-        z = projection_back(Y, X[:, :, 0])
+        z = projection_back(Y_t, X[:, :, 0])
+        Y_t *= np.conj(z[None, :, :])
+
+    ret = (Y,)
+
+    if return_filters:
+        ret += (W,)
+
+    if return_info:
+        n_run = np.count_nonzero(n_active)
+        ret += ({"n_iter": n_run, "n_active": n_active[:n_run], "cost": cost[:n_run]},)
+
+    if len(ret) == 1:
+        return Y
+    else:
+        return ret
+
+
+def overiva_batch(
+    X,
+    n_src=None,
+    n_iter=20,
+    proj_back=True,
+    W0=None,
+    model="laplace",
+    init_eig=False,
+    return_filters=False,
+):
+
+    """
+    Batched version of :py:func:`overiva`. Runs the iterative projection
+    updates for a stack of mixtures in a single vectorized pass. This is
+    useful when many short clips need to be separated, in which case the
+    Python overhead and the small matrix solves of :py:func:`overiva`
+    dominate the runtime.
+
+    Clips of different lengths may be provided as a list. They are then
+    zero-padded to the length of the longest clip and the padded frames are
+    masked out of all the statistics so that the result is the same as
+    running :py:func:`overiva` on every clip separately.
+
+    Parameters
+    ----------
+    X: ndarray (nbatch, nframes, nfrequencies, nchannels) or list of ndarray
+        STFT representation of the signals. A list of arrays of shape
+        (nframes_b, nfrequencies, nchannels) is also accepted
+    n_src: int, optional
+        The number of sources or independent components. Defaults to
+        ``nchannels``
+    n_iter: int, optional
+        The number of iterations (default 20)
+    proj_back: bool, optional
+        Scaling on first mic by back projection (default True)
+    W0: ndarray (nbatch, nfrequencies, nchannels, nsrc), optional
+        Initial value for demixing matrix
+    model: str or SourceModel
+        The model of source distribution, the name of a model of the
+        registry of :py:mod:`source_models`, e.g., 'gauss' or 'laplace'
+        (default), or a model object
+    init_eig: bool, optional (default ``False``)
+        If ``True``, and if ``W0 is None``, then the weights are initialized
+        using the principal eigenvectors of the covariance matrix of the input
+        data.
+    return_filters: bool
+        If true, the function will return the demixing matrices too
+
+    Returns
+    -------
+    Returns an (nbatch, nframes, nfrequencies, nsources) array, or a list
+    of (nframes_b, nfrequencies, nsources) arrays if the input was a list.
+    Also returns the demixing matrices (nbatch, nfrequencies, nchannels, nsources)
+    if ``return_filters`` keyword is True.
+    """
+
+    is_list = not isinstance(X, np.ndarray)
+
+    if is_list:
+        # zero-pad the clips to the same length
+        lengths = np.array([x.shape[0] for x in X])
+        n_freq, n_chan = X[0].shape[1:]
+        X_pad = np.zeros(
+            (len(X), np.max(lengths), n_freq, n_chan), dtype=np.result_type(*X)
+        )
+        for b, x in enumerate(X):
+            X_pad[b, : x.shape[0]] = x
+        X = X_pad
+
+    n_batch, n_frames, n_freq, n_chan = X.shape
+
+    if not is_list:
+        lengths = np.full(n_batch, n_frames)
+
+    # mask of the valid frames, shape (n_batch, n_frames)
+    mask = np.arange(n_frames)[None, :] < lengths[:, None]
+
+    # default to determined case
+    if n_src is None:
+        n_src = n_chan
+
+    source_model = get_model(model)
+
+    # All the outer products of the input vectors, shape (n_batch, n_frames, M)
+    # with M = 2 * n_freq * n_chan ** 2, viewed as real numbers so that the
+    # weighted covariance matrices of all the sources and frequencies can be
+    # obtained with a single real matrix product per clip
+    XX = X[:, :, :, :, None] * np.conj(X[:, :, :, None, :])
+    XX = XX.reshape((n_batch, n_frames, -1)).view(XX.real.dtype)
+
+    # Things are more efficient when the frequencies are over the first axes
+    # shape (n_batch, n_freq, n_frames, n_chan)
+    X = X.transpose([0, 2, 1, 3]).copy()
+
+    # covariance matrix of input signal (n_batch, n_freq, n_chan, n_chan)
+    Cx = (X.swapaxes(2, 3) @ np.conj(X)) / lengths[:, None, None, None]
+
+    W_hat = np.zeros((n_batch, n_freq, n_chan, n_chan), dtype=X.dtype)
+    W = W_hat[:, :, :, :n_src]
+    J = W_hat[:, :, :n_src, n_src:]
+
+    def tensor_H(T):
+        return np.conj(T).swapaxes(-1, -2)
+
+    def update_J_from_orth_const():
+        tmp = np.matmul(tensor_H(W), Cx)
+        J[:, :, :, :] = np.linalg.solve(tmp[:, :, :, :n_src], tmp[:, :, :, n_src:])
+
+    # initialize A and W
+    if W0 is None:
+
+        if init_eig:
+            # Initialize the demixing matrices with the principal
+            # eigenvectors of the input covariance
+            _, w = principal_subspace(Cx.reshape((-1, n_chan, n_chan)), n_src)
+            W[:, :, :, :] = np.conj(w).reshape(W.shape)
+
+        else:
+            # Or with identity
+            W[:, :, :n_src, :] = np.eye(n_src)
+
+    else:
+        W[:, :, :, :] = W0
+
+    # We still need to initialize the rest of the matrix
+    if n_src < n_chan:
+        update_J_from_orth_const()
+        W_hat[:, :, n_src:, n_src:] = -np.eye(n_chan - n_src)
+
+    V = np.zeros((n_batch, n_src, n_freq, n_chan, n_chan), dtype=X.dtype)
+    r_inv = np.zeros((n_batch, n_frames, n_src))
+    r = np.zeros((n_batch, n_frames, n_src))
+
+    Y = np.zeros((n_batch, n_freq, n_frames, n_src), dtype=X.dtype)
+
+    # Compute the demixed output
+    def demix(Y, X, W):
+        Y[:, :, :, :] = X @ np.conj(W)
+
+    for epoch in range(n_iter):
+
+        demix(Y, X, W)
+
+        # shape: (n_batch, n_frames, n_src), the clips are processed one by
+        # one so that a model averaging over frames stops at the padding
+        norms = np.sum(np.abs(Y) ** 2, axis=1)
+        for b, l in enumerate(lengths):
+            source_model.auxiliary(norms[b, :l], n_freq, r[b, :l])
+            r[b, l:] = 0.0
+
+        # set the scale of r, the padded frames are zero and do not contribute
+        if source_model.degree is not None:
+            gamma = r.sum(axis=1) / lengths[:, None]
+            r /= gamma[:, None, :]
+
+            # Y is not rescaled since it is recomputed before its next use
+            W /= source_model.scale(gamma[:, None, None, :])
+
+        # ensure some numerical stability
+        eps = 1e-15
+        r[r < eps] = eps
+
+        r_inv[:, :, :] = 1.0 / r
+        r_inv[~mask] = 0.0
+
+        # Compute Auxiliary Variables of all sources at once
+        # shape: (n_batch, n_src, n_freq, n_chan, n_chan)
+        V[:, :, :, :, :] = (r_inv.swapaxes(1, 2) @ XX).view(X.dtype).reshape(V.shape)
+        V /= lengths[:, None, None, None, None]
+
+        # Update now the demixing matrix, the clips and frequencies are
+        # flattened in a single stack
+        ip = IterativeProjection(
+            W_hat.reshape((-1, n_chan, n_chan)), Cx.reshape((-1, n_chan, n_chan)), n_src
+        )
+        for s in range(n_src):
+            V_s = V[:, s].reshape((-1, n_chan, n_chan))
+            w = ip.project(V_s, [s])[:, :, 0]
+            ip.update(s, normalize(w, V_s, ip.W[:, :, s]))
+
+    demix(Y, X, W)
+
+    # shape (n_frames, n_batch * n_freq, n_src), the padded frames
+    # are zero and do not affect the projection back
+    Y = Y.transpose([2, 0, 1, 3]).reshape((n_frames, n_batch * n_freq, n_src))
+
+    if proj_back:
+        X_ref = X[:, :, :, 0].transpose([2, 0, 1]).reshape((n_frames, n_batch * n_freq))
+        z = projection_back(Y, X_ref)
         Y *= np.conj(z[None, :, :])
 
+    Y = Y.reshape((n_frames, n_batch, n_freq, n_src)).swapaxes(0, 1)
+
+    if is_list:
+        Y = [Y[b, :l].copy() for b, l in enumerate(lengths)]
+    else:
+        Y = Y.copy()
+
     if return_filters:
         return Y, W
     else:
         return Y
+
+
+def overiva_chunked(
+    X,
+    n_src=None,
+    n_iter=20,
+    proj_back=True,
+    W0=None,
+    model="laplace",
+    init_eig=False,
+    update="ip",
+    max_bytes=2 ** 28,
+    out=None,
+    return_filters=False,
+):
+
+    """
+    Memory-bounded version of :py:func:`overiva` for very long recordings.
+
+    The frequency bins are only coupled through the auxiliary variables
+    ``r``, which are sums over the frequencies. The input is thus processed by
+    chunks of frequencies that are read, one at a time, from ``X``, which can
+    be a memory-mapped array. Every pass over the chunks updates the demixing
+    matrices with the current ``r`` and accumulates the norms of the new
+    output, from which the ``r`` of the next iteration are computed. The
+    temporaries never exceed about ``max_bytes``, apart from the demixing and
+    covariance matrices, which have no frame dimension. The result is the
+    same as that of :py:func:`overiva`.
+
+    Parameters
+    ----------
+    X: ndarray (nframes, nfrequencies, nchannels)
+        STFT representation of the signal, possibly a ``numpy.memmap``
+    n_src: int, optional
+        The number of sources or independent components. Defaults to
+        ``nchannels``
+    n_iter: int, optional
+        The number of iterations (default 20)
+    proj_back: bool, optional
+        Scaling on first mic by back projection (default True)
+    W0: ndarray (nfrequencies, nchannels, nsrc), optional
+        Initial value for demixing matrix
+    model: str or SourceModel
+        The model of source distribution, the name of a model of the
+        registry of :py:mod:`source_models`, e.g., 'gauss' or 'laplace'
+        (default), or a model object
+    init_eig: bool, optional (default ``False``)
+        If ``True``, and if ``W0 is None``, then the weights are initialized
+        using the principal eigenvectors of the covariance matrix of the input
+        data.
+    update: str, optional
+        The update rule of the demixing matrix, 'ip' (default) or 'ip2'
+    max_bytes: int, optional
+        The memory budget of the temporaries of one chunk (default 256 MB)
+    out: ndarray (nframes, nfrequencies, nsrc), optional
+        The array where to store the output, possibly a ``numpy.memmap``
+    return_filters: bool
+        If true, the function will return the demixing matrix too
+
+    Returns
+    -------
+    Returns an (nframes, nfrequencies, nsources) array. Also returns
+    the demixing matrix (nfrequencies, nchannels, nsources)
+    if ``return_filters`` keyword is True.
+    """
+
+    n_frames, n_freq, n_chan = X.shape
+
+    # default to determined case
+    if n_src is None:
+        n_src = n_chan
+
+    source_model = get_model(model)
+
+    # the pairs of sources updated together by IP2
+    pairs = _pairs(n_src, update)
+
+    # one frequency of a chunk holds the input, a weighted copy of it, and
+    # the output
+    bytes_per_freq = n_frames * (2 * n_chan + n_src) * X.itemsize
+    chunk_size = int(max(1, min(n_freq, max_bytes // bytes_per_freq)))
+    chunks = [
+        (f_start, min(f_start + chunk_size, n_freq))
+        for f_start in range(0, n_freq, chunk_size)
+    ]
+
+    def load(f_start, f_end):
+        # frequency-major copy of a chunk, shape (chunk_size, n_frames, n_chan)
+        return np.ascontiguousarray(X[:, f_start:f_end, :].swapaxes(0, 1))
+
+    def covariance(X_c):
+        return WeightedCovariance(
+            X_c.swapaxes(0, 1), n_src, max_bytes=max_bytes, cache=False
+        )
+
+    if out is None:
+        out = np.zeros((n_frames, n_freq, n_src), dtype=X.dtype)
+
+    # the covariance matrices are kept in double precision, the updates are
+    # solved in double precision, see :py:func:`overiva`
+    Cx = np.zeros((n_freq, n_chan, n_chan), dtype=np.complex128)
+    W_hat = np.zeros((n_freq, n_chan, n_chan), dtype=X.dtype)
+    W = W_hat[:, :, :n_src]
+    J = W_hat[:, :n_src, n_src:]
+
+    def tensor_H(T):
+        return np.conj(T).swapaxes(1, 2)
+
+    def update_J_from_orth_const(F):
+        tmp = np.matmul(tensor_H(W[F]), Cx[F])
+        J[F] = np.linalg.solve(tmp[:, :, :n_src], tmp[:, :, n_src:])
+
+    V = np.zeros((n_src, chunk_size, n_chan, n_chan), dtype=np.complex128)
+
+    r_inv = np.zeros((n_frames, n_src), dtype=X.real.dtype)
+    r = np.zeros((n_frames, n_src), dtype=X.real.dtype)
+
+    # the squared norms of the output over all the frequencies, accumulated
+    # chunk by chunk in double precision
+    norms = np.zeros((n_frames, n_src))
+
+    def demix(X_c, F, last):
+        Y_c = X_c @ np.conj(W[F])
+        norms[:, :] += np.sum(np.abs(Y_c) ** 2, axis=0)
+
+        if last:
+            if proj_back:
+                z = projection_back(Y_c.swapaxes(0, 1), X_c[:, :, 0].swapaxes(0, 1))
+                Y_c *= np.conj(z[:, None, :])
+            out[:, F, :] = Y_c.swapaxes(0, 1)
+
+    # first pass: initialize the demixing matrices and compute the output
+    for f_start, f_end in chunks:
+        F = slice(f_start, f_end)
+        X_c = load(f_start, f_end)
+
+        # covariance matrix of input signal (chunk_size, n_chan, n_chan)
+        covariance(X_c).covariance(out=Cx[F])
+
+        if W0 is None:
+
+            if init_eig:
+                # Initialize the demixing matrices with the principal
+                # eigenvectors of the input covariance
+                _, w = principal_subspace(Cx[F], n_src)
+                W[F] = np.conj(w)
+
+            else:
+                # Or with identity
+                W[F, :n_src, :] = np.eye(n_src)
+
+        else:
+            W[F] = W0[F]
+
+        # We still need to initialize the rest of the matrix
+        if n_src < n_chan:
+            update_J_from_orth_const(F)
+            W_hat[F, n_src:, n_src:] = -np.eye(n_chan - n_src)
+
+        demix(X_c, F, n_iter == 0)
+
+    for epoch in range(n_iter):
+
+        # shape: (n_frames, n_src)
+        source_model.auxiliary(norms, n_freq, r)
+
+        # set the scale of r, the output is recomputed before its next use
+        if source_model.degree is not None:
+            gamma = r.mean(axis=0)
+            r /= gamma[None, :]
+
+            W /= source_model.scale(gamma[None, None, :])
+
+        # ensure some numerical stability
+        eps = 1e-15
+        r[r < eps] = eps
+
+        r_inv[:, :] = 1.0 / r
+
+        norms[:, :] = 0.0
+
+        for f_start, f_end in chunks:
+            F = slice(f_start, f_end)
+            n_f = f_end - f_start
+            X_c = load(f_start, f_end)
+
+            # Compute the Auxiliary Variables of all the sources of the chunk
+            cov = covariance(X_c)
+            cov.update(r_inv)
+            for s in range(n_src):
+                cov.expand(s, out=V[s, :n_f])
+
+            ip = IterativeProjection(W_hat[F], Cx[F], n_src)
+
+            if pairs is None:
+
+                for s in range(n_src):
+                    V_s = V[s, :n_f]
+
+                    w = ip.project(V_s, [s])[:, :, 0]
+                    ip.update(s, normalize(w, V_s, W[F, :, s]))
+
+            else:
+
+                for m, n in pairs:
+                    P, U = [], []
+                    for s in [m, n]:
+                        V_s = V[s, :n_f]
+
+                        P.append(ip.project(V_s, [m, n]))
+                        U.append(tensor_H(P[-1]) @ V_s @ P[-1])
+
+                    c_m, c_n = _gev_2x2(U[0], U[1])
+
+                    ip.update(m, (P[0] @ c_m)[:, :, 0])
+                    ip.update(n, (P[1] @ c_n)[:, :, 0])
+
+            demix(X_c, F, epoch == n_iter - 1)
+
+    if return_filters:
+        return out, W
+    else:
+        return out
+
+
+def _select_frames(X, n, select, seed, chunk_size):
+    # the sorted indices of the fitting frames
+    n_frames = X.shape[0]
+    rng = np.random.RandomState(seed)
+
+    if select == "strided":
+        return np.linspace(0, n_frames, n, endpoint=False).astype(int)
+
+    elif select == "random":
+        return np.sort(rng.choice(n_frames, size=n, replace=False))
+
+    elif select == "energy":
+        # frames drawn with a probability proportional to their energy, the
+        # floor keeps the silent frames in the draw
+        energy = np.zeros(n_frames)
+        for t in range(0, n_frames, chunk_size):
+            energy[t : t + chunk_size] = np.sum(
+                np.abs(X[t : t + chunk_size]) ** 2, axis=(1, 2)
+            )
+        energy += 1e-10 * np.mean(energy) + 1e-300
+        p = energy / np.sum(energy)
+        return np.sort(rng.choice(n_frames, size=n, replace=False, p=p))
+
+    else:
+        raise ValueError("Unknown frame selection {}".format(select))
+
+
+def overiva_subsampled(
+    X,
+    n_src=None,
+    fit_frames=0.25,
+    select="strided",
+    seed=None,
+    proj_back=True,
+    max_bytes=2 ** 28,
+    out=None,
+    return_filters=False,
+    return_info=False,
+    **kwargs
+):
+
+    """
+    Fits the demixing matrices of :py:func:`overiva` on a subset of the
+    frames only, and then applies them to all the frames. The cost of the
+    iterations depends on the number of fitting frames only, and the full
+    recording is read once for the separation, by blocks of frames, which
+    makes it possible to separate very long recordings quickly.
+
+    Parameters
+    ----------
+    X: ndarray (nframes, nfrequencies, nchannels)
+        STFT representation of the signal, possibly a ``numpy.memmap``
+    n_src: int, optional
+        The number of sources or independent components. Defaults to
+        ``nchannels``
+    fit_frames: int or float, optional
+        The number of fitting frames, or their fraction of the frames if it
+        is a float (default 0.25)
+    select: str, optional
+        The selection of the fitting frames, either 'strided' (default) for
+        evenly spaced frames, 'random' for frames drawn uniformly at random,
+        or 'energy' for frames drawn with a probability proportional to their
+        energy
+    seed: int, optional
+        The seed of the random selections
+    proj_back: bool, optional
+        Scaling on first mic by back projection (default True), the scales
+        are computed on all the frames
+    max_bytes: int, optional
+        The memory budget of the temporaries of one block of frames when the
+        filters are applied (default 256 MB)
+    out: ndarray (nframes, nfrequencies, nsrc), optional
+        The array where to store the output, possibly a ``numpy.memmap``
+    return_filters: bool
+        If true, the function will return the demixing matrix too
+    return_info: bool
+        If true, the function will also return the info dictionary of
+        :py:func:`overiva`, with the indices of the fitting frames in
+        ``fit_frames``
+    **kwargs:
+        Other keyword arguments of :py:func:`overiva`, e.g., ``n_iter``,
+        ``model``, ``update``, ``tol``, or ``init_eig``. The callback is
+        called with the separated fitting frames.
+
+    Returns
+    -------
+    Returns an (nframes, nfrequencies, nsources) array. Also returns
+    the demixing matrix (nfrequencies, nchannels, nsources)
+    if ``return_filters`` keyword is True, and the info dictionary
+    if ``return_info`` is True.
+    """
+
+    n_frames, n_freq, n_chan = X.shape
+
+    # default to determined case
+    if n_src is None:
+        n_src = n_chan
+
+    if isinstance(fit_frames, float):
+        fit_frames = int(round(fit_frames * n_frames))
+    n_fit = int(min(max(fit_frames, 1), n_frames))
+
+    # a block of frames holds the input and the output
+    bytes_per_frame = n_freq * (n_chan + n_src) * X.itemsize
+    chunk_size = int(max(1, min(n_frames, max_bytes // bytes_per_frame)))
+
+    index = _select_frames(X, n_fit, select, seed, chunk_size)
+
+    _, W, info = overiva(
+        X[index],
+        n_src=n_src,
+        proj_back=proj_back,
+        return_filters=True,
+        return_info=True,
+        **kwargs
+    )
+
+    if out is None:
+        out = np.zeros((n_frames, n_freq, n_src), dtype=X.dtype)
+
+    # the statistics of the projection back, accumulated while separating
+    pb_num = np.zeros((n_freq, n_src), dtype=X.dtype)
+    pb_denom = np.zeros((n_freq, n_src), dtype=X.real.dtype)
+
+    for t in range(0, n_frames, chunk_size):
+        X_c = np.asarray(X[t : t + chunk_size])
+        Y_c = (X_c.swapaxes(0, 1) @ np.conj(W)).swapaxes(0, 1)
+        out[t : t + chunk_size] = Y_c
+
+        if proj_back:
+            pb_num += np.sum(np.conj(X_c[:, :, :1]) * Y_c, axis=0)
+            pb_denom += np.sum(np.abs(Y_c) ** 2, axis=0)
+
+    if proj_back:
+        z = np.ones((n_freq, n_src), dtype=X.dtype)
+        I = pb_denom > 0.0
+        z[I] = pb_num[I] / pb_denom[I]
+        for t in range(0, n_frames, chunk_size):
+            out[t : t + chunk_size] *= np.conj(z[None, :, :])
+
+    ret = (out,)
+
+    if return_filters:
+        ret += (W,)
+
+    if return_info:
+        info["fit_frames"] = index
+        ret += (info,)
+
+    if len(ret) == 1:
+        return out
+    else:
+        return ret
+
+
+class OverIVA(object):
+    """
+    Stateful overdetermined IVA separator for consecutive segments of a
+    recording made with the same array.
+
+    The demixing matrices found on one segment are the warm start of the
+    next segment, which needs much fewer iterations than a cold start when
+    the sources do not move much, in particular together with ``tol``. The
+    work arrays of :py:func:`overiva` are kept between calls and only
+    reallocated when the shape of the segments changes.
+
+    Parameters
+    ----------
+    n_src: int, optional
+        The number of sources or independent components. Defaults to the
+        number of channels of the first segment.
+    n_iter: int, optional
+        The maximum number of iterations per segment (default 20)
+    proj_back: bool, optional
+        Scaling on first mic by back projection (default True)
+    **kwargs:
+        Other keyword arguments of :py:func:`overiva`, e.g., ``model``,
+        ``update``, ``tol``, ``init_eig``, ``n_jobs``, or ``layout``
+
+    Attributes
+    ----------
+    W_: ndarray (nfrequencies, nchannels, nsrc)
+        The current demixing matrices, ``None`` before the first fit
+    info_: dict
+        The info dictionary of :py:func:`overiva` for the last segment
+    """
+
+    def __init__(self, n_src=None, n_iter=20, proj_back=True, **kwargs):
+
+        self.n_src = n_src
+        self.n_iter = n_iter
+        self.proj_back = proj_back
+        self.kwargs = kwargs
+
+        self.W_ = None
+        self.info_ = None
+        self.workspace = {}
+
+    def fit(self, X):
+        """
+        Estimates the demixing matrices from a cold start
+
+        Parameters
+        ----------
+        X: ndarray (nframes, nfrequencies, nchannels)
+            STFT representation of the signal
+
+        Returns
+        -------
+        The separator itself
+        """
+
+        self.W_ = None
+        return self.partial_fit(X)
+
+    def partial_fit(self, X):
+        """
+        Updates the demixing matrices with a new segment, starting from the
+        current ones
+
+        Parameters
+        ----------
+        X: ndarray (nframes, nfrequencies, nchannels)
+            STFT representation of the signal
+
+        Returns
+        -------
+        The separator itself
+        """
+
+        self._run(X)
+        return self
+
+    def fit_transform(self, X):
+        """
+        Same as :py:meth:`partial_fit`, but returns the separated segment
+
+        Parameters
+        ----------
+        X: ndarray (nframes, nfrequencies, nchannels)
+            STFT representation of the signal
+
+        Returns
+        -------
+        Returns an (nframes, nfrequencies, nsources) array
+        """
+
+        return self._run(X)
+
+    def transform(self, X):
+        """
+        Separates a segment with the current demixing matrices, without
+        updating them
+
+        Parameters
+        ----------
+        X: ndarray (nframes, nfrequencies, nchannels)
+            STFT representation of the signal
+
+        Returns
+        -------
+        Returns an (nframes, nfrequencies, nsources) array
+        """
+
+        if self.W_ is None:
+            raise ValueError("The separator should be fitted first")
+
+        self._check_shape(X)
+
+        if self.kwargs.get("layout", "frames") == "frames":
+            Y = (X.swapaxes(0, 1) @ np.conj(self.W_)).swapaxes(0, 1).copy()
+            Y_t, X_t = Y, X
+        else:
+            Y = X @ np.conj(self.W_)
+            Y_t, X_t = Y.swapaxes(0, 1), X.swapaxes(0, 1)
+
+        if self.proj_back:
+            z = projection_back(Y_t, X_t[:, :, 0])
+            Y_t *= np.conj(z[None, :, :])
+
+        return Y
+
+    def _check_shape(self, X):
+        if self.kwargs.get("layout", "frames") == "frames":
+            n_freq, n_chan = X.shape[1:]
+        else:
+            n_freq, n_chan = X.shape[0], X.shape[2]
+
+        if (n_freq, n_chan) != self.W_.shape[:2]:
+            raise ValueError(
+                "The segments should have {} frequencies and {} channels".format(
+                    *self.W_.shape[:2]
+                )
+            )
+
+    def _run(self, X):
+        """ Runs overiva on a segment and keeps the demixing matrices """
+
+        if self.W_ is not None:
+            self._check_shape(X)
+
+        Y, W, self.info_ = overiva(
+            X,
+            n_src=self.n_src,
+            n_iter=self.n_iter,
+            proj_back=self.proj_back,
+            W0=self.W_,
+            return_filters=True,
+            return_info=True,
+            workspace=self.workspace,
+            **self.kwargs
+        )
+
+        # W is a view in the workspace that is overwritten by the next call
+        self.W_ = W.copy()
+
+        return Y
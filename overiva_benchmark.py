@@ -0,0 +1,941 @@
+# Copyright (c) 2019 Robin Scheibler
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+Runtime benchmarks of the separation algorithms. The mixtures are generated
+directly in the STFT domain so that the benchmarks do not need the speech
+samples. The sources have a time-varying variance shared by all frequencies
+and are mixed with random matrices, plus a diffuse background noise.
+"""
+import argparse, json, os, tempfile, time, tracemalloc
+import numpy as np
+import pyroomacoustics as pra
+
+from covariance import (
+    IterativeProjection,
+    WeightedCovariance,
+    normalize,
+    principal_subspace,
+)
+from overiva import (
+    OverIVA,
+    overiva,
+    overiva_batch,
+    overiva_chunked,
+    overiva_subsampled,
+)
+from overiva_online import overiva_online
+from overilrma import overilrma
+from ive import auxive, ogive, ogive_deflation
+from source_models import models
+import kernels
+
+
+def synthetic_mixture(n_frames, n_freq, n_chan, n_src, snr=20.0, seed=None):
+    """
+    Generate a random mixture in the STFT domain
+
+    Parameters
+    ----------
+    n_frames: int
+        The number of STFT frames
+    n_freq: int
+        The number of frequency bins
+    n_chan: int
+        The number of microphones
+    n_src: int
+        The number of target sources
+    snr: float
+        The signal-to-noise ratio of the background noise in decibels
+    seed: int, optional
+        Seed of the random number generator
+
+    Returns
+    -------
+    The mixture (n_frames, n_freq, n_chan) and the images of the sources on
+    the first microphone (n_frames, n_freq, n_src)
+    """
+    rng = np.random.RandomState(seed)
+
+    def crandn(*shape):
+        return (rng.randn(*shape) + 1j * rng.randn(*shape)) / np.sqrt(2)
+
+    # super-gaussian sources with a variance varying over time
+    var = rng.gamma(0.5, size=(n_frames, 1, n_src))
+    S = np.sqrt(var) * crandn(n_frames, n_freq, n_src)
+    A = crandn(n_freq, n_chan, n_src)
+
+    X = (S.swapaxes(0, 1) @ A.swapaxes(1, 2)).swapaxes(0, 1)
+    X += 10 ** (-snr / 20) * np.sqrt(np.mean(var)) * crandn(n_frames, n_freq, n_chan)
+
+    ref = A[None, :, 0, :] * S
+
+    return X, ref
+
+
+def room_mixture(n_frames, n_freq, n_chan, n_src, snr=60.0, fs=16000, seed=None):
+    """
+    Generate a mixture recorded in a simulated shoebox room by a compact
+    circular array, the covariance matrices of the low frequencies are then
+    ill-conditioned as for real recordings
+
+    Parameters
+    ----------
+    n_frames: int
+        The number of STFT frames
+    n_freq: int
+        The number of frequency bins, the frames are of ``2 * (n_freq - 1)``
+        samples with half overlap
+    n_chan: int
+        The number of microphones
+    n_src: int
+        The number of sources
+    snr: float
+        The signal-to-noise ratio of the microphone noise in decibels
+    fs: int
+        The sampling frequency
+    seed: int, optional
+        Seed of the random number generator
+
+    Returns
+    -------
+    The mixture (n_frames, n_freq, n_chan) and the images of the sources on
+    the first microphone (n_frames, n_freq, n_src)
+    """
+    rng = np.random.RandomState(seed)
+    nfft = 2 * (n_freq - 1)
+    n_samples = (n_frames + 1) * nfft // 2
+
+    try:
+        room = pra.ShoeBox([10, 7.5, 3], fs=fs, absorption=0.35, max_order=17)
+    except TypeError:
+        # the recent versions of pyroomacoustics take the energy absorption
+        materials = pra.Material(1.0 - 0.65 ** 2)
+        room = pra.ShoeBox([10, 7.5, 3], fs=fs, materials=materials, max_order=17)
+
+    # white noise modulated by a slowly varying super-gaussian envelope
+    n_env = n_samples // nfft + 2
+    for s in range(n_src):
+        env = np.repeat(rng.gamma(0.5, size=n_env), nfft)[:n_samples]
+        loc = [rng.uniform(2.0, 8.0), rng.uniform(1.5, 6.0), rng.uniform(1.0, 2.0)]
+        room.add_source(loc, signal=np.sqrt(env) * rng.randn(n_samples))
+
+    mic_locs = pra.circular_2D_array([5.0, 3.75], n_chan, 0.0, 0.04)
+    mic_locs = np.concatenate((mic_locs, 1.2 * np.ones((1, n_chan))))
+    room.add_microphone_array(pra.MicrophoneArray(mic_locs, fs))
+
+    premix = room.simulate(return_premix=True)[:, :, :n_samples]
+    premix /= np.std(premix[:, 0, :], axis=1)[:, None, None]
+    mix = np.sum(premix, axis=0)
+    mix += 10 ** (-snr / 20) * rng.randn(*mix.shape)
+
+    def stft(x):
+        win = pra.hann(nfft)
+        return pra.transform.stft.analysis(x, nfft, nfft // 2, win=win)
+
+    ref = np.stack([stft(image) for image in premix[:, 0, :]], axis=2)
+
+    return stft(mix.T), ref
+
+
+def sdr(Y, ref):
+    """
+    Signal-to-distortion ratio computed in the STFT domain, each reference is
+    matched to the output that has the best SDR
+
+    Parameters
+    ----------
+    Y: ndarray (n_frames, n_freq, n_out)
+        The separated signals
+    ref: ndarray (n_frames, n_freq, n_src)
+        The reference signals
+
+    Returns
+    -------
+    The SDR of every reference in decibels
+    """
+    err = np.sum(np.abs(ref[:, :, :, None] - Y[:, :, None, :]) ** 2, axis=(0, 1))
+    pwr = np.sum(np.abs(ref) ** 2, axis=(0, 1))
+    return 10 * np.log10(pwr / np.min(err, axis=1))
+
+
+def bench_online(args):
+    """ Real-time factor of the block-online algorithm compared to the offline one """
+
+    X, ref = synthetic_mixture(
+        args.frames, args.freq, args.mics, args.srcs, seed=args.seed
+    )
+    duration = args.frames * args.hop / args.fs
+
+    # evaluate on the second half when the online algorithm has converged
+    half = args.frames // 2
+
+    tic = time.perf_counter()
+    Y = overiva(X, n_src=args.srcs, n_iter=args.n_iter)
+    runtime = time.perf_counter() - tic
+    print(
+        "offline: RTF {:.3f} SDR {}".format(
+            runtime / duration, sdr(Y[half:], ref[half:])
+        )
+    )
+
+    tic = time.perf_counter()
+    Y = overiva_online(
+        X,
+        n_src=args.srcs,
+        block_size=args.block,
+        n_iter=args.n_iter_block,
+        forget=args.forget,
+    )
+    runtime = time.perf_counter() - tic
+    print(
+        "online:  RTF {:.3f} SDR {} latency {:.3f} s".format(
+            runtime / duration,
+            sdr(Y[half:], ref[half:]),
+            args.block * args.hop / args.fs,
+        )
+    )
+
+
+def time_to_sdr(X, ref, target, iter_grid, **kwargs):
+    """
+    Runtime of the shortest run of overiva, among those with a number of
+    iterations in ``iter_grid``, that reaches the target average SDR
+    """
+    for n_iter in iter_grid:
+        tic = time.perf_counter()
+        Y = overiva(X, n_iter=n_iter, **kwargs)
+        runtime = time.perf_counter() - tic
+
+        if np.mean(sdr(Y, ref)) >= target:
+            return n_iter, runtime
+
+    return np.nan, np.nan
+
+
+def bench_update(args):
+    """ Time to reach a given SDR for the different update rules """
+
+    X, ref = synthetic_mixture(
+        args.frames, args.freq, args.mics, args.srcs, seed=args.seed
+    )
+
+    if args.target is None:
+        # reference: what IP achieves with the full number of iterations
+        Y = overiva(X, n_src=args.srcs, n_iter=args.n_iter)
+        target = np.mean(sdr(Y, ref)) - 0.5
+    else:
+        target = args.target
+
+    iter_grid = [1, 2, 3, 5, 7, 10, 15, 20, 30, 50, 70, 100, 150, 200]
+    iter_grid = [i for i in iter_grid if i <= args.n_iter]
+
+    print("Target SDR {:.2f} dB".format(target))
+    for update in ["ip", "ip2"]:
+        n_iter, runtime = time_to_sdr(
+            X, ref, target, iter_grid, n_src=args.srcs, update=update
+        )
+        print("{:4s} iterations {} runtime {:.3f} s".format(update, n_iter, runtime))
+
+
+def bench_precision(args):
+    """
+    Runtime in single and double precision, and loss of SDR of the single
+    precision compared to the double precision, on mixtures recorded in a
+    simulated room whose low frequencies are ill-conditioned. The loss is
+    bounded by ``max_loss`` decibels
+    """
+
+    max_loss = 0.1
+
+    algorithms = {
+        "overiva": lambda X: overiva(X, n_src=args.srcs, n_iter=args.n_iter),
+        "ogive": lambda X: ogive(X, n_iter=args.n_iter, update="switching"),
+    }
+
+    for seed in range(args.seed, args.seed + 3):
+        X, ref = room_mixture(args.frames, args.freq, args.mics, args.srcs, seed=seed)
+
+        for name, algo in algorithms.items():
+            results = {}
+            for dtype in [np.complex128, np.complex64]:
+                X_p = X.astype(dtype)
+                tic = time.perf_counter()
+                Y = algo(X_p)
+                runtime = time.perf_counter() - tic
+                assert Y.dtype == dtype, "The output should have the type of the input"
+                assert np.all(np.isfinite(Y)), "The output should be finite"
+                results[dtype] = (runtime, sdr(Y, ref[:, :, : Y.shape[2]]))
+
+            (t_d, sdr_d), (t_s, sdr_s) = results[np.complex128], results[np.complex64]
+            loss = np.max(np.abs(sdr_d - sdr_s))
+            print(
+                "seed {} {:8s} double {:.3f} s single {:.3f} s speed-up {:.2f} SDR loss {:.2e} dB".format(
+                    seed, name, t_d, t_s, t_d / t_s, loss
+                )
+            )
+            assert loss < max_loss, "The SDR loss of single precision is too large"
+
+
+def bench_chunked(args):
+    """
+    Peak memory and runtime of the frequency-chunked algorithm reading the
+    input from a memory-mapped file, compared to the in-memory algorithm
+    """
+
+    X, _ = synthetic_mixture(
+        args.frames, args.freq, args.mics, args.srcs, seed=args.seed
+    )
+    print("input size {:.1f} MB".format(X.nbytes / 2 ** 20))
+
+    tracemalloc.start()
+    tic = time.perf_counter()
+    Y = overiva(X, n_src=args.srcs, n_iter=args.n_iter)
+    runtime = time.perf_counter() - tic
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(
+        "in memory: peak {:.1f} MB runtime {:.3f} s".format(peak / 2 ** 20, runtime)
+    )
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename = os.path.join(tmpdir, "stft.dat")
+        X_map = np.memmap(filename, dtype=X.dtype, mode="w+", shape=X.shape)
+        X_map[:] = X
+        X_map.flush()
+        del X_map
+
+        X_map = np.memmap(filename, dtype=X.dtype, mode="r", shape=X.shape)
+
+        tracemalloc.start()
+        tic = time.perf_counter()
+        Y_c = overiva_chunked(
+            X_map, n_src=args.srcs, n_iter=args.n_iter, max_bytes=args.max_bytes
+        )
+        runtime = time.perf_counter() - tic
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        del X_map
+
+    print(
+        "chunked:   peak {:.1f} MB runtime {:.3f} s max error {:.2e}".format(
+            peak / 2 ** 20, runtime, np.max(np.abs(Y - Y_c)) / np.max(np.abs(Y))
+        )
+    )
+
+
+def bench_warm(args):
+    """
+    Number of iterations per segment needed to separate consecutive segments
+    of a recording when every segment starts from scratch, or is warm
+    started from the previous one
+    """
+
+    X, ref = synthetic_mixture(
+        args.frames, args.freq, args.mics, args.srcs, seed=args.seed
+    )
+
+    segments = range(args.segment, args.frames, args.segment)
+
+    def run(n_iter, warm):
+        # returns the average SDR and the runtime over all the segments
+        separator = OverIVA(n_src=args.srcs, n_iter=n_iter)
+        separator.fit(X[: args.segment])
+
+        sdrs = []
+        tic = time.perf_counter()
+        for t in segments:
+            if not warm:
+                separator.W_ = None
+            Y = separator.fit_transform(X[t : t + args.segment])
+            sdrs.append(np.mean(sdr(Y, ref[t : t + args.segment])))
+        runtime = time.perf_counter() - tic
+
+        return np.mean(sdrs), runtime
+
+    # reference: what a cold start achieves with the full number of iterations
+    target = run(args.n_iter, False)[0] - 0.1
+    print("Target SDR {:.2f} dB".format(target))
+
+    iter_grid = [1, 2, 3, 5, 7, 10, 15, 20, 30, 50, 70, 100, 150, 200]
+    iter_grid = [i for i in iter_grid if i <= args.n_iter]
+
+    for name, warm in [("cold", False), ("warm", True)]:
+        for n_iter in iter_grid:
+            avg_sdr, runtime = run(n_iter, warm)
+            if avg_sdr >= target:
+                break
+        print(
+            "{} start: iterations per segment {} runtime {:.3f} s".format(
+                name, n_iter, runtime
+            )
+        )
+
+
+def bench_init(args):
+    """
+    Runtime of the principal subspace of the input covariance matrices used
+    by ``init_eig``, compared to the full eigenvalue decompositions
+    """
+
+    X, _ = synthetic_mixture(
+        args.frames, args.freq, args.mics, args.srcs, seed=args.seed
+    )
+    Cx = WeightedCovariance(X, 1).covariance()
+
+    tic = time.perf_counter()
+    v, w = np.linalg.eig(Cx)
+    W_eig = np.zeros((args.freq, args.mics, args.srcs), dtype=X.dtype)
+    for f in range(args.freq):
+        ind = np.argsort(v[f])[-args.srcs :]
+        W_eig[f] = w[f][:, ind]
+    t_eig = time.perf_counter() - tic
+
+    tic = time.perf_counter()
+    np.linalg.eigh(Cx)
+    t_eigh = time.perf_counter() - tic
+
+    tic = time.perf_counter()
+    _, W_sub = principal_subspace(Cx, args.srcs)
+    t_sub = time.perf_counter() - tic
+
+    # the eigenvectors are only defined up to a phase, compare the projectors
+    def proj(W):
+        return W @ np.conj(W).swapaxes(1, 2)
+
+    print(
+        "eig {:.3f} s eigh {:.3f} s subspace {:.3f} s max error {:.2e}".format(
+            t_eig, t_eigh, t_sub, np.max(np.abs(proj(W_eig) - proj(W_sub)))
+        )
+    )
+
+
+def bench_covariance(args):
+    """
+    Runtime of one update of the weighted covariance matrices at 8 and 16
+    channels, streamed by blocks of frequencies, compared to one batched
+    matrix product per source on a frequency-major copy of the input
+    """
+
+    for n_chan in [8, 16]:
+        X, _ = synthetic_mixture(
+            args.frames, args.freq, n_chan, args.srcs, seed=args.seed
+        )
+        X_f = np.ascontiguousarray(X.swapaxes(0, 1))
+
+        for n_src in [args.srcs, n_chan]:
+            r_inv = np.random.RandomState(args.seed).rand(args.frames, n_src)
+
+            tic = time.perf_counter()
+            V = np.zeros((n_src, args.freq, n_chan, n_chan), dtype=X.dtype)
+            for s in range(n_src):
+                V[s] = (X_f.swapaxes(1, 2) * r_inv[:, s]) @ np.conj(X_f)
+            V /= args.frames
+            t_ref = time.perf_counter() - tic
+
+            covs = WeightedCovariance(X, n_src, cache=False)
+            tic = time.perf_counter()
+            covs.update(r_inv)
+            t_stream = time.perf_counter() - tic
+
+            error = max(
+                np.max(np.abs(covs.expand(s) - V[s])) / np.max(np.abs(V[s]))
+                for s in range(n_src)
+            )
+            assert error < 1e-10
+
+            print(
+                "mics {:2d} sources {:2d} per source {:.3f} s streamed {:.3f} s".format(
+                    n_chan, n_src, t_ref, t_stream
+                )
+            )
+
+
+def bench_projection(args):
+    """
+    Runtime of the IP updates of all the sources, best of five, with the
+    Sherman-Morrison updates of the orthogonal constraints compared to the
+    solve with W_hat^H V_s followed by the update of J after every source
+    """
+
+    rng = np.random.RandomState(args.seed)
+
+    def crandn(*shape):
+        return rng.randn(*shape) + 1j * rng.randn(*shape)
+
+    for n_chan in [8, 16, 32]:
+        for n_src in [2, 4]:
+            # random covariance matrices of the input and of the sources
+            A = crandn(n_src + 1, args.freq, n_chan, 2 * n_chan)
+            C = A @ np.conj(A).swapaxes(2, 3) / (2 * n_chan)
+            Cx, V = C[0], C[1:]
+
+            W_init = np.zeros((args.freq, n_chan, n_chan), dtype=complex)
+            W_init[:, :, :n_src] = crandn(args.freq, n_chan, n_src)
+            W_init[:, n_src:, n_src:] = -np.eye(n_chan - n_src)
+            IterativeProjection(W_init, Cx, n_src)
+            eyes = np.broadcast_to(np.eye(n_chan), W_init.shape)
+
+            t_ref, t_ip = [], []
+            for rep in range(5):
+                W_ref = W_init.copy()
+                tic = time.perf_counter()
+                for s in range(n_src):
+                    WV = np.conj(W_ref).swapaxes(1, 2) @ V[s]
+                    w = np.linalg.solve(WV, eyes[:, :, [s]])[:, :, 0]
+                    W_ref[:, :, s] = normalize(w, V[s], W_ref[:, :, s])
+                    tmp = np.conj(W_ref[:, :, :n_src]).swapaxes(1, 2) @ Cx
+                    W_ref[:, :n_src, n_src:] = np.linalg.solve(
+                        tmp[:, :, :n_src], tmp[:, :, n_src:]
+                    )
+                t_ref.append(time.perf_counter() - tic)
+
+                W_hat = W_init.copy()
+                tic = time.perf_counter()
+                ip = IterativeProjection(W_hat, Cx, n_src)
+                for s in range(n_src):
+                    w = ip.project(V[s], [s])[:, :, 0]
+                    ip.update(s, normalize(w, V[s], ip.W[:, :, s]))
+                t_ip.append(time.perf_counter() - tic)
+
+            error = np.max(np.abs(W_hat - W_ref)) / np.max(np.abs(W_ref))
+            assert error < 1e-8, "The structured update should match the generic one"
+
+            print(
+                "mics {:2d} sources {:2d} generic {:.1f} ms structured {:.1f} ms speed-up {:.2f}".format(
+                    n_chan,
+                    n_src,
+                    1e3 * min(t_ref),
+                    1e3 * min(t_ip),
+                    min(t_ref) / min(t_ip),
+                )
+            )
+
+
+def bench_callback(args):
+    """
+    Runtime of overiva with a callback that monitors the SDR at every
+    iteration, run in the loop or in a background thread
+    """
+
+    X, ref = synthetic_mixture(
+        args.frames, args.freq, args.mics, args.srcs, seed=args.seed
+    )
+
+    tic = time.perf_counter()
+    overiva(X, n_src=args.srcs, n_iter=args.n_iter)
+    print("no callback      {:.3f} s".format(time.perf_counter() - tic))
+
+    for name, callback_async in [("callback", False), ("async callback", True)]:
+        sdrs = []
+        tic = time.perf_counter()
+        overiva(
+            X,
+            n_src=args.srcs,
+            n_iter=args.n_iter,
+            callback=lambda Y: sdrs.append(np.mean(sdr(Y, ref))),
+            callback_period=1,
+            callback_async=callback_async,
+        )
+        runtime = time.perf_counter() - tic
+        print(
+            "{:16s} {:.3f} s calls {} final SDR {:.2f} dB".format(
+                name, runtime, len(sdrs), sdrs[-1]
+            )
+        )
+
+
+def bench_backend(args):
+    """
+    Runtime of the numpy and compiled implementations of overiva and ogive.
+    The kernels are compiled, or loaded from the cache of numba, by a first
+    short run that is timed separately
+    """
+
+    if not kernels.has_numba:
+        print("numba is not installed, only the numpy backend is available")
+        return
+
+    X, _ = synthetic_mixture(
+        args.frames, args.freq, args.mics, args.srcs, seed=args.seed
+    )
+
+    algorithms = {
+        "overiva": lambda X, n_iter, backend: overiva(
+            X, n_src=args.srcs, n_iter=n_iter, backend=backend
+        ),
+        "ogive": lambda X, n_iter, backend: ogive(
+            X, n_iter=n_iter, tol=0.0, update="switching", backend=backend
+        ),
+    }
+
+    for name, algo in algorithms.items():
+        for dtype in [np.complex128, np.complex64]:
+            X_p = X.astype(dtype)
+
+            tic = time.perf_counter()
+            algo(X_p[:, :2], 1, "numba")
+            first_call = time.perf_counter() - tic
+
+            runtime, Y = {}, {}
+            for backend in ["numpy", "numba"]:
+                tic = time.perf_counter()
+                Y[backend] = algo(X_p, args.n_iter, backend)
+                runtime[backend] = time.perf_counter() - tic
+
+            if name == "overiva":
+                error = np.max(np.abs(Y["numba"] - Y["numpy"]))
+                error /= np.max(np.abs(Y["numpy"]))
+                assert error < 1e-4, "The backends should give the same output"
+
+            print(
+                "{:8s} {:10s} numpy {:.3f} s numba {:.3f} s speed-up {:.2f} (first call {:.1f} s)".format(
+                    name,
+                    np.dtype(dtype).name,
+                    runtime["numpy"],
+                    runtime["numba"],
+                    runtime["numpy"] / runtime["numba"],
+                    first_call,
+                )
+            )
+
+
+def bench_models(args):
+    """
+    Runtime and SDR of overiva with all the source models of the registry
+    """
+
+    X, ref = synthetic_mixture(
+        args.frames, args.freq, args.mics, args.srcs, seed=args.seed
+    )
+
+    for name in models:
+        tic = time.perf_counter()
+        Y, info = overiva(
+            X, n_src=args.srcs, n_iter=args.n_iter, model=name, return_info=True
+        )
+        runtime = time.perf_counter() - tic
+        rise = np.max(np.diff(info["cost"]), initial=0.0)
+        print(
+            "{:12s} runtime {:.3f} s SDR {:.2f} dB max cost rise {:.1e}".format(
+                name, runtime, np.mean(sdr(Y, ref)), rise
+            )
+        )
+
+        # the updates are majorization-minimization steps of the cost
+        assert rise < 1e-8 * np.abs(info["cost"][0]), "The cost increases"
+
+        # clips of different lengths in a batch are separated independently
+        clips = [X[: args.frames // 2], X]
+        Y_batch = overiva_batch(clips, n_src=args.srcs, n_iter=5, model=name)
+        for x, y in zip(clips, Y_batch):
+            y_ref = overiva(x, n_src=args.srcs, n_iter=5, model=name)
+            error = np.max(np.abs(y - y_ref)) / np.max(np.abs(y_ref))
+            assert error < 1e-4, "The padding changes the separation"
+
+
+def bench_ilrma(args):
+    """ Runtime and SDR of overdetermined ILRMA compared to ILRMA """
+
+    X, ref = synthetic_mixture(
+        args.frames, args.freq, args.mics, args.srcs, seed=args.seed
+    )
+
+    for name, algo, kwargs in [
+        ("ilrma", pra.bss.ilrma, {}),
+        ("overilrma", overilrma, {"n_src": args.srcs, "seed": args.seed}),
+    ]:
+        np.random.seed(args.seed)
+        tic = time.perf_counter()
+        Y = algo(X, n_iter=args.n_iter, n_components=2, **kwargs)
+        runtime = time.perf_counter() - tic
+        print(
+            "{:10s} runtime {:.3f} s SDR {:.2f} dB".format(
+                name, runtime, np.mean(sdr(Y, ref))
+            )
+        )
+
+
+def bench_subsample(args):
+    """ Runtime and SDR when the filters are fitted on a subset of the frames """
+
+    X, ref = synthetic_mixture(
+        args.frames, args.freq, args.mics, args.srcs, seed=args.seed
+    )
+
+    tic = time.perf_counter()
+    Y = overiva(X, n_src=args.srcs, n_iter=args.n_iter)
+    runtime = time.perf_counter() - tic
+    print(
+        "all frames       runtime {:.3f} s SDR {:.2f} dB".format(
+            runtime, np.mean(sdr(Y, ref))
+        )
+    )
+
+    for select in ["strided", "random", "energy"]:
+        for fraction in [0.5, 0.25, 0.1]:
+            tic = time.perf_counter()
+            Y = overiva_subsampled(
+                X,
+                n_src=args.srcs,
+                n_iter=args.n_iter,
+                fit_frames=fraction,
+                select=select,
+                seed=args.seed,
+            )
+            runtime = time.perf_counter() - tic
+            print(
+                "{:7s} {:.2f}     runtime {:.3f} s SDR {:.2f} dB".format(
+                    select, fraction, runtime, np.mean(sdr(Y, ref))
+                )
+            )
+
+
+def bench_accel(args):
+    """
+    Time to reach the cost of IP after ``n_iter`` iterations, with and
+    without the SQUAREM acceleration, over the grid of numbers of mics and
+    targets of the simulation
+    """
+
+    with open(os.path.join(os.path.dirname(__file__), "overiva_sim_config.json")) as f:
+        config = json.load(f)
+
+    print("mics srcs model    target      IP it   time   SQUAREM it   time")
+
+    for n_mics in config["n_mics_list"]:
+        for n_src in config["n_targets_list"]:
+            if n_src > n_mics:
+                continue
+
+            X, _ = synthetic_mixture(
+                args.frames, args.freq, n_mics, n_src, seed=args.seed
+            )
+
+            for model in ["laplace", "gauss"]:
+
+                # the trace of the cost, NaN when the iterations fail
+                def cost(accel):
+                    try:
+                        _, info = overiva(
+                            X,
+                            n_src=n_src,
+                            n_iter=args.n_iter,
+                            model=model,
+                            accel=accel,
+                            return_info=True,
+                        )
+                        return info["cost"]
+                    except np.linalg.LinAlgError:
+                        return np.array([np.nan])
+
+                c = cost(None)
+                target = c[-1] + 1e-3 * np.abs(c[0] - c[-1])
+
+                line = "{:4d} {:4d} {:8s} {:8.2f}".format(n_mics, n_src, model, target)
+
+                if not np.isfinite(target):
+                    print(line + "     IP diverged")
+                    continue
+
+                for accel in [None, "squarem"]:
+                    reached = np.flatnonzero(cost(accel) <= target)
+                    if len(reached) == 0:
+                        line += "     {:4s} {:6s}".format("-", "-")
+                        continue
+
+                    # the cost of iteration k is that of the demixing
+                    # matrices after k updates
+                    n_iter = reached[0] + 1
+                    tic = time.perf_counter()
+                    overiva(X, n_src=n_src, n_iter=n_iter, model=model, accel=accel)
+                    runtime = time.perf_counter() - tic
+                    line += "     {:4d} {:6.3f}".format(reached[0], runtime)
+
+                print(line)
+
+
+def bench_ive(args):
+    """ Runtime per second of audio of the single target extraction algorithms """
+
+    X, ref = synthetic_mixture(args.frames, args.freq, args.mics, 1, seed=args.seed)
+    duration = args.frames * args.hop / args.fs
+
+    # without any iteration, the output of the initial demixing vectors
+    for algo in [ogive, auxive]:
+        _, info = algo(X, n_iter=0, return_info=True)
+        assert info["n_iter"] == 0 and len(info["cost"]) == 0
+
+    for name, algo in [("ogive", ogive), ("auxive", auxive)]:
+        for model in ["laplace", "gauss"]:
+            tic = time.perf_counter()
+            Y, info = algo(X, model=model, return_info=True)
+            runtime = time.perf_counter() - tic
+            print(
+                "{:6s} {:7s} iterations {:4d} {:.3f} s per s SDR {:.2f} dB".format(
+                    name, model, info["n_iter"], runtime / duration, sdr(Y, ref)[0]
+                )
+            )
+
+
+def bench_step(args):
+    """ Iterations of OGIVE until the tolerance with fixed and adaptive steps """
+
+    X, ref = synthetic_mixture(args.frames, args.freq, args.mics, 1, seed=args.seed)
+
+    for update in ["demix", "mix", "switching"]:
+        for step_control in ["fixed", "bb"]:
+            # the output does not depend on the partition of the frequencies
+            Y_jobs = [
+                ogive(
+                    X, n_iter=500, update=update, step_control=step_control, n_jobs=j
+                )
+                for j in [1, 4]
+            ]
+            error = np.max(np.abs(Y_jobs[1] - Y_jobs[0])) / np.max(np.abs(Y_jobs[0]))
+            assert error < 1e-12, "The output should not depend on n_jobs"
+
+            tic = time.perf_counter()
+            Y, info = ogive(
+                X,
+                n_iter=4000,
+                update=update,
+                step_control=step_control,
+                return_info=True,
+            )
+            runtime = time.perf_counter() - tic
+            print(
+                "{:9s} {:5s} iterations {:4d} runtime {:.3f} s SDR {:.2f} dB".format(
+                    update, step_control, info["n_iter"], runtime, sdr(Y, ref)[0]
+                )
+            )
+
+
+def bench_deflation(args):
+    """ Runtime per second of audio of the extraction of several targets """
+
+    duration = args.frames * args.hop / args.fs
+
+    for n_src in range(1, min(args.srcs, args.mics) + 1):
+        X, ref = synthetic_mixture(
+            args.frames, args.freq, args.mics, n_src, seed=args.seed
+        )
+
+        for name, algo in [
+            ("overiva", lambda X: overiva(X, n_src=n_src, return_info=True)),
+            (
+                "deflation",
+                lambda X: ogive_deflation(
+                    X, n_src=n_src, step_control="bb", return_info=True
+                ),
+            ),
+        ]:
+            tic = time.perf_counter()
+            Y, info = algo(X)
+            runtime = time.perf_counter() - tic
+            print(
+                "{} targets {:9s} iterations {:4d} {:.3f} s per s SDR {}".format(
+                    n_src,
+                    name,
+                    info["n_iter"],
+                    runtime / duration,
+                    np.round(sdr(Y, ref), 2),
+                )
+            )
+
+
+benchmarks = {
+    "online": bench_online,
+    "update": bench_update,
+    "precision": bench_precision,
+    "chunked": bench_chunked,
+    "warm": bench_warm,
+    "init": bench_init,
+    "covariance": bench_covariance,
+    "projection": bench_projection,
+    "callback": bench_callback,
+    "backend": bench_backend,
+    "models": bench_models,
+    "ilrma": bench_ilrma,
+    "subsample": bench_subsample,
+    "accel": bench_accel,
+    "ive": bench_ive,
+    "step": bench_step,
+    "deflation": bench_deflation,
+}
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description="Runtime benchmarks of the separation algorithms"
+    )
+    parser.add_argument(
+        "benchmark", type=str, choices=benchmarks.keys(), help="The benchmark to run"
+    )
+    parser.add_argument("-m", "--mics", type=int, default=4, help="Number of mics")
+    parser.add_argument("-s", "--srcs", type=int, default=2, help="Number of sources")
+    parser.add_argument(
+        "-f", "--frames", type=int, default=1000, help="Number of STFT frames"
+    )
+    parser.add_argument(
+        "--freq", type=int, default=513, help="Number of frequency bins"
+    )
+    parser.add_argument("--fs", type=int, default=16000, help="Sampling frequency")
+    parser.add_argument("--hop", type=int, default=512, help="STFT hop size")
+    parser.add_argument(
+        "-n", "--n_iter", type=int, default=100, help="Number of iterations"
+    )
+    parser.add_argument(
+        "-b", "--block", type=int, default=8, help="Block size of the online algorithm"
+    )
+    parser.add_argument(
+        "--n_iter_block",
+        type=int,
+        default=2,
+        help="Number of iterations per block of the online algorithm",
+    )
+    parser.add_argument(
+        "--forget",
+        type=float,
+        default=0.97,
+        help="Forgetting factor of the online algorithm",
+    )
+    parser.add_argument(
+        "--target",
+        type=float,
+        help="Target SDR, by default 0.5 dB less than IP after n_iter iterations",
+    )
+    parser.add_argument(
+        "--max_bytes",
+        type=int,
+        default=2 ** 24,
+        help="Memory budget of the chunked algorithm",
+    )
+    parser.add_argument(
+        "--segment",
+        type=int,
+        default=250,
+        help="Number of frames per segment of the warm start benchmark",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    args = parser.parse_args()
+
+    benchmarks[args.benchmark](args)
@@ -42,7 +42,8 @@ from routines import (
 )
 from overiva import overiva
 from auxiva_pca import auxiva_pca
-from ive import ogive, ogive_matlab_wrapper
+from ive import auxive, ogive, ogive_deflation, ogive_matlab_wrapper
+from source_models import models
 
 # Get the data if needed
 from get_data import get_data, samples_dir
@@ -63,9 +64,12 @@ if __name__ == "__main__":
         "ilrma",
         "ogive",
         "ogive_matlab",
+        "ogive_deflation",
+        "auxive",
     ]
-    model_choices = ['laplace', 'gauss']
+    model_choices = list(models.keys())
     init_choices = ['eye', 'eig']
+    precision_choices = ['double', 'single']
 
     import argparse
 
@@ -103,6 +107,14 @@ if __name__ == "__main__":
     parser.add_argument("-m", "--mics", type=int, default=5, help="Number of mics")
     parser.add_argument("-s", "--srcs", type=int, default=2, help="Number of sources")
     parser.add_argument("-n", "--n_iter", type=int, default=51, help="Number of iterations")
+    parser.add_argument(
+        "-p",
+        "--precision",
+        type=str,
+        default=precision_choices[0],
+        choices=precision_choices,
+        help="Floating point precision of the STFT and of the separation",
+    )
     parser.add_argument(
         "--gui",
         action="store_true",
@@ -133,8 +145,8 @@ if __name__ == "__main__":
     n_sources = 14
     n_mics = args.mics
     n_sources_target = args.srcs  # the determined case
-    if args.algo.startswith("ogive"):
-        print("OGIVE only works with a single source. Using only one source.")
+    if args.algo in ["ogive", "ogive_matlab", "auxive"]:
+        print("OGIVE and AuxIVE only work with a single source. Using only one source.")
         n_sources_target = 1
 
     use_fake_blinky = False
@@ -292,7 +304,7 @@ if __name__ == "__main__":
     # shape: (n_frames, n_freq, n_mics)
     X_all = pra.transform.analysis(
         mics_signals.T, framesize, framesize // 2, win=win_a
-    ).astype(np.complex128)
+    ).astype(np.complex128 if args.precision == "double" else np.complex64)
     X_mics = X_all[:, :, :n_mics]
 
     tic = time.perf_counter()
@@ -360,6 +372,28 @@ if __name__ == "__main__":
             init_eig=(args.init == init_choices[1]),
             callback=convergence_callback,
         )
+    elif args.algo == "ogive_deflation":
+        # Run OGIVE for the targets, one after the other
+        Y = ogive_deflation(
+            X_mics,
+            n_src=n_sources_target,
+            n_iter=ogive_iter,
+            step_size=ogive_mu,
+            update=ogive_update,
+            proj_back=True,
+            model=args.dist,
+            init_eig=(args.init == init_choices[1]),
+        )
+    elif args.algo == "auxive":
+        # Run AuxIVE
+        Y = auxive(
+            X_mics,
+            n_iter=n_iter,
+            proj_back=True,
+            model=args.dist,
+            init_eig=(args.init == init_choices[1]),
+            callback=convergence_callback,
+        )
     else:
         raise ValueError("No such algorithm {}".format(args.algo))
 
@@ -0,0 +1,238 @@
+# Copyright (c) 2019 Robin Scheibler
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+Block-online implementation of overdetermined IVA. The covariance of the
+input and the auxiliary variables of the sources are tracked with an
+exponential forgetting factor so that the memory used does not depend on
+the length of the stream.
+"""
+import numpy as np
+
+from covariance import IterativeProjection, normalize
+from source_models import get_model
+
+
+def overiva_stream(
+    blocks,
+    n_src=None,
+    n_iter=2,
+    forget=0.97,
+    proj_back=True,
+    W0=None,
+    model="laplace",
+):
+
+    """
+    Block-online overdetermined IVA. This is a generator that consumes blocks
+    of STFT frames and yields the separated frames of every block as soon as
+    it has been processed.
+
+    For every block, the running estimates of the input covariance matrix and
+    of the auxiliary variables are updated as
+
+        V <- forget * V + (1 - forget) * V_block
+
+    and ``n_iter`` iterative projection updates are run.
+
+    Parameters
+    ----------
+    blocks: iterable of ndarray (nframes_block, nfrequencies, nchannels)
+        STFT frames of the signal, in blocks
+    n_src: int, optional
+        The number of sources or independent components. Defaults to the
+        number of channels of the first block.
+    n_iter: int, optional
+        The number of iterations run per block (default 2)
+    forget: float, optional
+        The forgetting factor of the running estimates (default 0.97)
+    proj_back: bool, optional
+        Scaling on first mic by back projection (default True)
+    W0: ndarray (nfrequencies, nchannels, nsrc), optional
+        Initial value for demixing matrix
+    model: str or SourceModel
+        The model of source distribution, see :py:func:`overiva.overiva`
+
+    Yields
+    ------
+    The separated blocks, (nframes_block, nfrequencies, nsources) arrays
+    """
+
+    W_hat, V, Cx = None, None, None
+
+    source_model = get_model(model)
+
+    def tensor_H(T):
+        return np.conj(T).swapaxes(1, 2)
+
+    for X in blocks:
+
+        n_frames, n_freq, n_chan = X.shape
+
+        if W_hat is None:
+
+            # default to determined case
+            if n_src is None:
+                n_src = n_chan
+
+            W_hat = np.zeros((n_freq, n_chan, n_chan), dtype=X.dtype)
+            W = W_hat[:, :, :n_src]
+            J = W_hat[:, :n_src, n_src:]
+
+            if W0 is None:
+                W[:, :n_src, :] = np.eye(n_src)
+            else:
+                W[:, :, :] = W0
+
+            if n_src < n_chan:
+                W_hat[:, n_src:, n_src:] = -np.eye(n_chan - n_src)
+
+            # the running estimates, the first block initializes them
+            Cx = np.zeros((n_freq, n_chan, n_chan), dtype=X.dtype)
+            V = np.zeros((n_src, n_freq, n_chan, n_chan), dtype=X.dtype)
+            pb_num = np.zeros((n_freq, n_src), dtype=X.dtype)
+            pb_denom = np.zeros((n_freq, n_src), dtype=X.real.dtype)
+            alpha = 0.0
+
+        # All the outer products of the input frames, seen as real numbers,
+        # shape (n_frames, 2 * n_freq * n_chan ** 2)
+        XX = X[:, :, :, None] * np.conj(X[:, :, None, :])
+        XX = XX.reshape((n_frames, -1)).view(XX.real.dtype)
+
+        Cx *= alpha
+        Cx += (1.0 - alpha) * np.mean(XX, axis=0).view(X.dtype).reshape(Cx.shape)
+
+        if n_src < n_chan:
+            tmp = np.matmul(tensor_H(W), Cx)
+            J[:, :, :] = np.linalg.solve(tmp[:, :, :n_src], tmp[:, :, n_src:])
+
+        V_new = np.zeros_like(V)
+        r = np.zeros((n_frames, n_src), dtype=X.real.dtype)
+
+        # frequency-major view of the block, shape (n_freq, n_frames, n_chan)
+        X_f = X.swapaxes(0, 1)
+
+        for epoch in range(n_iter):
+
+            Y = X_f @ np.conj(W)
+
+            # shape: (n_frames, n_src)
+            source_model.auxiliary(np.sum(np.abs(Y) ** 2, axis=0), n_freq, r)
+
+            # ensure some numerical stability
+            eps = 1e-15
+            r[r < eps] = eps
+
+            # the new auxiliary variables of all the sources at once
+            # shape: (n_src, n_freq, n_chan, n_chan)
+            V_new[:, :, :, :] = ((1.0 / r.T) @ XX).view(X.dtype).reshape(V.shape)
+            V_new *= (1.0 - alpha) / n_frames
+            V_new += alpha * V
+
+            ip = IterativeProjection(W_hat, Cx, n_src)
+            for s in range(n_src):
+                w = ip.project(V_new[s], [s])[:, :, 0]
+                ip.update(s, normalize(w, V_new[s], W[:, :, s]))
+
+        V[:, :, :, :] = V_new
+
+        # Separate the frames of the current block
+        Y = (X_f @ np.conj(W)).swapaxes(0, 1)
+
+        if proj_back:
+            # running estimate of the projection back on the first mic
+            pb_num *= alpha
+            pb_num += (1.0 - alpha) * np.mean(np.conj(X[:, :, :1]) * Y, axis=0)
+            pb_denom *= alpha
+            pb_denom += (1.0 - alpha) * np.mean(np.abs(Y) ** 2, axis=0)
+
+            z = np.ones((n_freq, n_src), dtype=X.dtype)
+            I = pb_denom > 0.0
+            z[I] = pb_num[I] / pb_denom[I]
+            Y *= np.conj(z[None, :, :])
+
+        alpha = forget
+
+        yield Y
+
+
+def overiva_online(
+    X,
+    n_src=None,
+    block_size=8,
+    n_iter=2,
+    forget=0.97,
+    proj_back=True,
+    W0=None,
+    model="laplace",
+):
+
+    """
+    Runs the block-online overdetermined IVA of :py:func:`overiva_stream` on
+    a full STFT tensor. This is mostly useful to compare with the offline
+    algorithm, the output is the same as that of a stream processed block by
+    block.
+
+    Parameters
+    ----------
+    X: ndarray (nframes, nfrequencies, nchannels)
+        STFT representation of the signal
+    n_src: int, optional
+        The number of sources or independent components
+    block_size: int, optional
+        The number of frames per block (default 8)
+    n_iter: int, optional
+        The number of iterations per block (default 2)
+    forget: float, optional
+        The forgetting factor of the running estimates (default 0.97)
+    proj_back: bool, optional
+        Scaling on first mic by back projection (default True)
+    W0: ndarray (nfrequencies, nchannels, nsrc), optional
+        Initial value for demixing matrix
+    model: str or SourceModel
+        The model of source distribution, see :py:func:`overiva.overiva`
+
+    Returns
+    -------
+    Returns an (nframes, nfrequencies, nsources) array.
+    """
+
+    n_frames, n_freq, n_chan = X.shape
+
+    if n_src is None:
+        n_src = n_chan
+
+    blocks = (X[t : t + block_size] for t in range(0, n_frames, block_size))
+
+    Y = np.zeros((n_frames, n_freq, n_src), dtype=X.dtype)
+
+    t = 0
+    for Y_block in overiva_stream(
+        blocks,
+        n_src=n_src,
+        n_iter=n_iter,
+        forget=forget,
+        proj_back=proj_back,
+        W0=W0,
+        model=model,
+    ):
+        Y[t : t + Y_block.shape[0]] = Y_block
+        t += Y_block.shape[0]
+
+    return Y
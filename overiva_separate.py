@@ -0,0 +1,339 @@
+# Copyright (c) 2019 Robin Scheibler
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+Separation of a multichannel WAV file
+=====================================
+
+The WAV file is memory-mapped and read by blocks of frames, the STFT is
+computed one block at a time, and the separated signals are synthesized by
+overlap-add and written to the output WAV file as soon as their frames are
+ready. With the 'online' algorithm, the whole pipeline is streamed and the
+memory does not depend on the length of the file. The offline algorithms
+only keep the STFT of the input and of the output in memory.
+
+    python ./overiva_separate.py mix.wav separated.wav -s 2 -a subsampled
+"""
+import argparse, time, tracemalloc, wave
+import numpy as np
+from scipy.io import wavfile
+
+import pyroomacoustics as pra
+
+from overiva import overiva, overiva_subsampled
+from overiva_online import overiva_stream
+from source_models import models
+
+
+def read_wav(filename):
+    """
+    Memory-maps a WAV file
+
+    Parameters
+    ----------
+    filename: str
+        The path to a 16 or 32 bit integer, or floating point, WAV file
+
+    Returns
+    -------
+    The sampling frequency, the (nsamples, nchannels) memory-mapped samples,
+    and the function that converts a block of samples to floating point
+    numbers in [-1, 1]
+    """
+    fs, x = wavfile.read(filename, mmap=True)
+
+    if x.ndim == 1:
+        x = x[:, None]
+
+    if x.dtype.kind == "i":
+        scale = 2.0 ** (8 * x.dtype.itemsize - 1)
+        return fs, x, lambda b: b / scale
+    elif x.dtype.kind == "u":
+        return fs, x, lambda b: (b - 128.0) / 128.0
+    else:
+        return fs, x, lambda b: b
+
+
+def stft_blocks(x, convert, framesize, hop, win, block, dtype=np.complex128):
+    """
+    Generator of the STFT of a signal by blocks of frames. The signal is
+    padded with ``framesize - hop`` zeros at the beginning and at the end so
+    that all the samples are covered by the same number of frames.
+
+    Parameters
+    ----------
+    x: ndarray (nsamples, nchannels)
+        The signal, possibly a ``numpy.memmap``
+    convert: func
+        Converts a block of samples to floating point numbers
+    framesize: int
+        The size of the frames, a multiple of ``hop``
+    hop: int
+        The shift between two frames
+    win: ndarray (framesize,)
+        The analysis window
+    block: int
+        The number of frames per block
+    dtype: numpy.dtype, optional
+        The complex type of the STFT (default ``numpy.complex128``)
+
+    Yields
+    ------
+    The blocks of STFT frames, (nframes_block, framesize // 2 + 1, nchannels)
+    arrays
+    """
+    n_samples, n_chan = x.shape
+    pad = framesize - hop
+    n_frames = (n_samples - 1 + pad) // hop + 1
+    real = np.zeros(0, dtype=dtype).real.dtype
+
+    for t in range(0, n_frames, block):
+        n = min(block, n_frames - t)
+
+        # the samples of the block, zero outside of the signal
+        start = t * hop - pad
+        stop = start + (n - 1) * hop + framesize
+        seg = np.zeros((stop - start, n_chan), dtype=real)
+        a, b = max(start, 0), min(stop, n_samples)
+        seg[a - start : b - start] = convert(x[a:b])
+
+        frames = np.lib.stride_tricks.as_strided(
+            seg,
+            shape=(n, framesize, n_chan),
+            strides=(hop * seg.strides[0],) + seg.strides,
+            writeable=False,
+        )
+        yield np.fft.rfft(frames * win[None, :, None], axis=1).astype(dtype)
+
+
+def istft_blocks(blocks, framesize, hop, win, n_samples):
+    """
+    Generator of the overlap-add synthesis of blocks of STFT frames, the
+    inverse of :py:func:`stft_blocks`.
+
+    Parameters
+    ----------
+    blocks: iterable of ndarray (nframes_block, framesize // 2 + 1, nsrc)
+        The blocks of STFT frames
+    framesize: int
+        The size of the frames, a multiple of ``hop``
+    hop: int
+        The shift between two frames
+    win: ndarray (framesize,)
+        The synthesis window
+    n_samples: int
+        The length of the signal
+
+    Yields
+    ------
+    The blocks of samples that are complete, (nsamples_block, nsrc) arrays
+    """
+    pad = framesize - hop
+    n_seg = framesize // hop
+
+    # the position of the next sample in the padded signal, and the samples
+    # that still get contributions from the next frames
+    pos = 0
+    tail = None
+
+    def trim(y, pos):
+        # removes the padding
+        return y[max(0, pad - pos) : max(0, n_samples + pad - pos)]
+
+    for Y in blocks:
+        n, _, n_src = Y.shape
+
+        frames = np.fft.irfft(Y, n=framesize, axis=1) * win[None, :, None]
+        frames = frames.reshape((n, n_seg, hop, n_src))
+
+        y = np.zeros((n - 1 + n_seg, hop, n_src))
+        for k in range(n_seg):
+            y[k : k + n] += frames[:, k]
+        y = y.reshape((-1, n_src))
+
+        if tail is not None:
+            y[:pad] += tail
+        tail = y[n * hop :]
+
+        yield trim(y[: n * hop], pos)
+        pos += n * hop
+
+    if tail is not None:
+        yield trim(tail, pos)
+
+
+if __name__ == "__main__":
+
+    algo_choices = ["overiva", "subsampled", "online"]
+    model_choices = list(models.keys())
+    precision_choices = ["double", "single"]
+
+    parser = argparse.ArgumentParser(
+        description="Separates the sources of a multichannel WAV file"
+    )
+    parser.add_argument("input", type=str, help="The multichannel WAV file")
+    parser.add_argument(
+        "output", type=str, help="The WAV file where to write the separated signals"
+    )
+    parser.add_argument("-s", "--srcs", type=int, default=2, help="Number of sources")
+    parser.add_argument(
+        "-a",
+        "--algo",
+        type=str,
+        default=algo_choices[0],
+        choices=algo_choices,
+        help="overiva: offline, subsampled: offline fitted on a subset of "
+        "the frames, online: block-online",
+    )
+    parser.add_argument(
+        "-d",
+        "--dist",
+        type=str,
+        default=model_choices[0],
+        choices=model_choices,
+        help="IVA model distribution",
+    )
+    parser.add_argument(
+        "-n", "--n_iter", type=int, default=20, help="Number of iterations"
+    )
+    parser.add_argument("--framesize", type=int, default=4096, help="STFT frame size")
+    parser.add_argument(
+        "-b",
+        "--block",
+        type=int,
+        default=64,
+        help="Number of frames per block of the STFT and of the synthesis",
+    )
+    parser.add_argument(
+        "--fit_frames",
+        type=float,
+        default=0.25,
+        help="Fraction of the frames used to fit the 'subsampled' algorithm",
+    )
+    parser.add_argument(
+        "--n_iter_block",
+        type=int,
+        default=2,
+        help="Number of iterations per block of the online algorithm",
+    )
+    parser.add_argument(
+        "--forget",
+        type=float,
+        default=0.97,
+        help="Forgetting factor of the online algorithm",
+    )
+    parser.add_argument(
+        "-p",
+        "--precision",
+        type=str,
+        default=precision_choices[0],
+        choices=precision_choices,
+        help="Floating point precision of the STFT and of the separation",
+    )
+    parser.add_argument(
+        "--memory",
+        action="store_true",
+        help="Reports the peak memory, this slows down the processing",
+    )
+    args = parser.parse_args()
+
+    if args.memory:
+        tracemalloc.start()
+
+    tic = time.perf_counter()
+
+    fs, x, convert = read_wav(args.input)
+    n_samples, n_chan = x.shape
+
+    assert args.srcs <= n_chan, "More sources than microphones is not supported"
+
+    framesize = args.framesize
+    hop = framesize // 2
+    win_a = pra.hann(framesize)
+    win_s = pra.transform.stft.compute_synthesis_window(win_a, hop)
+    dtype = np.complex128 if args.precision == "double" else np.complex64
+
+    n_freq = framesize // 2 + 1
+    n_frames = (n_samples - 1 + framesize - hop) // hop + 1
+    stft_bytes = n_frames * n_freq * n_chan * np.dtype(dtype).itemsize
+
+    blocks = stft_blocks(x, convert, framesize, hop, win_a, args.block, dtype=dtype)
+
+    if args.algo == "online":
+        # the separated blocks are synthesized as soon as they are ready
+        Y_blocks = overiva_stream(
+            blocks,
+            n_src=args.srcs,
+            n_iter=args.n_iter_block,
+            forget=args.forget,
+            model=args.dist,
+        )
+
+    else:
+        # the STFT is stored frequency-major, which is the layout used by
+        # the separation, to avoid a copy
+        X = np.zeros((n_freq, n_frames, n_chan), dtype=dtype)
+        t = 0
+        for X_b in blocks:
+            X[:, t : t + X_b.shape[0], :] = X_b.swapaxes(0, 1)
+            t += X_b.shape[0]
+
+        if args.algo == "overiva":
+            Y = overiva(
+                X, n_src=args.srcs, n_iter=args.n_iter, model=args.dist, layout="freq"
+            ).swapaxes(0, 1)
+        elif args.algo == "subsampled":
+            Y = overiva_subsampled(
+                X.swapaxes(0, 1),
+                n_src=args.srcs,
+                n_iter=args.n_iter,
+                model=args.dist,
+                fit_frames=args.fit_frames,
+            )
+
+        del X
+
+        Y_blocks = (Y[t : t + args.block] for t in range(0, n_frames, args.block))
+
+    with wave.open(args.output, "wb") as f:
+        f.setnchannels(args.srcs)
+        f.setsampwidth(2)
+        f.setframerate(fs)
+
+        for y in istft_blocks(Y_blocks, framesize, hop, win_s, n_samples):
+            y = np.clip(np.round(y * 2 ** 15), -(2 ** 15), 2 ** 15 - 1)
+            f.writeframes(y.astype("<i2").tobytes())
+
+    runtime = time.perf_counter() - tic
+    duration = n_samples / fs
+
+    print(
+        "Processed {:.1f} s of audio in {:.2f} s, throughput {:.1f} s/s".format(
+            duration, runtime, duration / runtime
+        )
+    )
+
+    if args.memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(
+            "Peak memory {:.1f} MB, {:.2f} times the STFT of the input".format(
+                peak / 2 ** 20, peak / stft_bytes
+            )
+        )
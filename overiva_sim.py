@@ -67,9 +67,10 @@ def one_loop(args):
     sys.path.append(parameters["base_dir"])
 
     from routines import semi_circle_layout, random_layout, gm_layout, grid_layout
-    from overiva import overiva
-    from ive import ogive
+    from overiva import overiva, overiva_subsampled
+    from ive import auxive, ogive, ogive_deflation
     from auxiva_pca import auxiva_pca
+    from overilrma import overilrma
 
     # import samples helper routine
     from get_data import samples_dir
@@ -250,8 +251,8 @@ def one_loop(args):
         if name == "auxiva_pca" and n_targets == 1:
             # PCA doesn't work for single source scenario
             continue
-        elif name == "ogive" and n_targets != 1:
-            # OGIVE is only for single target
+        elif name in ["ogive", "auxive"] and n_targets != 1:
+            # OGIVE and AuxIVE are only for single target
             continue
 
         results.append(
@@ -265,6 +266,9 @@ def one_loop(args):
                 "sdr": [],
                 "sir": [],  # to store the result
                 "runtime" : np.nan,
+                "n_iter" : np.nan,
+                "n_active" : [],
+                "cost" : [],
                 "n_samples" : n_samples,
             }
         )
@@ -295,7 +299,7 @@ def one_loop(args):
             if name == "auxiva":
                 # Run AuxIVA
                 # this calls full IVA when `n_src` is not provided
-                Y = overiva(X_mics, callback=cb, **kwargs)
+                Y, info = overiva(X_mics, callback=cb, return_info=True, **kwargs)
 
             elif name == "auxiva_pca":
 
@@ -304,21 +308,67 @@ def one_loop(args):
 
             elif name == "overiva":
                 # Run BlinkIVA
-                Y = overiva(X_mics, n_src=n_targets, callback=cb, **kwargs)
+                Y, info = overiva(
+                    X_mics, n_src=n_targets, callback=cb, return_info=True, **kwargs
+                )
+
+            elif name == "overiva_sub":
+                # Run OverIVA on a subset of the frames, the callback would
+                # only get the fitting frames
+                Y, info = overiva_subsampled(
+                    X_mics, n_src=n_targets, return_info=True, **kwargs
+                )
 
             elif name == "ilrma":
                 # Run AuxIVA
                 Y = pra.bss.ilrma(X_mics, callback=cb, **kwargs)
 
+            elif name == "overilrma":
+                # Run overdetermined ILRMA
+                Y, info = overilrma(
+                    X_mics,
+                    n_src=n_targets,
+                    seed=seed,
+                    callback=cb,
+                    return_info=True,
+                    **kwargs
+                )
+
             elif name == "ogive":
                 # Run OGIVE
-                Y = ogive(X_mics, callback=cb, **kwargs)
+                Y, info = ogive(X_mics, callback=cb, return_info=True, **kwargs)
+
+            elif name == "auxive":
+                # Run AuxIVE
+                Y, info = auxive(X_mics, callback=cb, return_info=True, **kwargs)
+
+            elif name == "ogive_deflation":
+                # Run OGIVE for the targets one after the other, there is
+                # no callback for all the targets at once
+                Y, info = ogive_deflation(
+                    X_mics, n_src=n_targets, return_info=True, **kwargs
+                )
 
             else:
                 continue
 
             t_finish = time.perf_counter()
 
+            # record the number of iterations actually run
+            if name in [
+                "auxiva",
+                "overiva",
+                "overiva_sub",
+                "ogive",
+                "ogive_deflation",
+                "auxive",
+                "overilrma",
+            ]:
+                results[-1]["n_iter"] = info["n_iter"]
+                results[-1]["cost"] = info["cost"].tolist()
+            if name in ["auxiva", "overiva", "overiva_sub"]:
+                results[-1]["n_active"] = info["n_active"].tolist()
+
             # The last evaluation
             convergence_callback(
                 Y,
@@ -265,8 +265,16 @@ if __name__ == "__main__":
             "auxiva_pca_gauss": "PCA+AuxIVA (Gauss)",
             "overiva_laplace": "OverIVA (Laplace)",
             "overiva_gauss": "OverIVA (Gauss)",
+            "overiva_sub2_laplace": "OverIVA 1/2 frames (Laplace)",
+            "overiva_sub4_laplace": "OverIVA 1/4 frames (Laplace)",
+            "overiva_sub4_energy_laplace": "OverIVA 1/4 energy (Laplace)",
             "ogive_laplace": "OGIVEw (Laplace)",
             "ogive_gauss": "OGIVEw (Gauss)",
+            "auxive_laplace": "AuxIVE (Laplace)",
+            "auxive_gauss": "AuxIVE (Gauss)",
+            "ogive_deflation_laplace": "OGIVE deflation (Laplace)",
+            "ilrma": "ILRMA",
+            "overilrma": "OverILRMA",
         }
     }
 
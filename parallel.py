@@ -0,0 +1,172 @@
+# Copyright (c) 2019 Robin Scheibler
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+Parallel processing of the frequency bins. All the updates of the
+algorithms are independent across frequencies, apart from the reductions
+over the frequencies of the auxiliary variables, so the bins are split in
+contiguous blocks that are processed by a pool of threads. Most of the work
+is done by numpy in routines that release the GIL.
+
+The monitoring callbacks of the algorithms can also be run in a background
+thread, so that they do not slow down the iterations.
+"""
+import collections, os, threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+class FrequencyBlocks(object):
+    """
+    Splits the frequency bins in contiguous blocks and runs functions over
+    all the blocks, in a pool of threads when more than one job is requested.
+
+    The BLAS library used by numpy may also be multi-threaded, in which case
+    it is best to limit its number of threads, e.g., with
+    ``OPENBLAS_NUM_THREADS=1``, to avoid over-subscription.
+
+    Parameters
+    ----------
+    n_freq: int
+        The number of frequency bins
+    n_jobs: int, optional
+        The number of threads. ``None`` (default) or 1 runs everything in the
+        calling thread, and negative values count from the number of CPUs,
+        e.g., -1 uses all of them.
+    """
+
+    def __init__(self, n_freq, n_jobs=None):
+
+        if n_jobs is None:
+            n_jobs = 1
+        elif n_jobs < 0:
+            n_jobs = max(1, os.cpu_count() + 1 + n_jobs)
+        elif n_jobs == 0:
+            raise ValueError("The number of jobs should be non-zero")
+
+        n_blocks = max(1, min(n_jobs, n_freq))
+        edges = np.linspace(0, n_freq, n_blocks + 1).astype(int)
+        self.blocks = [slice(start, end) for start, end in zip(edges[:-1], edges[1:])]
+
+        if n_blocks > 1:
+            self.executor = ThreadPoolExecutor(max_workers=n_blocks)
+        else:
+            self.executor = None
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def map(self, func):
+        """
+        Calls ``func(b, F)`` for all the blocks, where ``b`` is the index of
+        the block and ``F`` the slice of its frequencies, and returns the list
+        of the results
+        """
+
+        if self.executor is None:
+            return [func(b, F) for b, F in enumerate(self.blocks)]
+        else:
+            return list(self.executor.map(func, range(len(self.blocks)), self.blocks))
+
+    def close(self):
+        """ Terminates the threads """
+
+        if self.executor is not None:
+            self.executor.shutdown()
+
+
+class CallbackWorker(object):
+    """
+    Runs a function in a background thread on the arguments submitted by the
+    caller. The pending arguments are kept in a queue of at most
+    ``max_queue`` elements and, when it is full, the oldest ones are dropped
+    so that the caller never waits for the function.
+
+    The arguments should be snapshots that the caller does not modify after
+    their submission. An exception raised by the function stops the worker
+    and is raised again by the next call to :py:meth:`submit` or
+    :py:meth:`close`.
+
+    Parameters
+    ----------
+    func: func
+        The function, called with the submitted arguments
+    max_queue: int, optional
+        The maximum number of pending calls (default 2)
+    """
+
+    def __init__(self, func, max_queue=2):
+
+        if max_queue < 1:
+            raise ValueError("The queue should hold at least one element")
+
+        self.func = func
+        self.queue = collections.deque(maxlen=max_queue)
+        self.cond = threading.Condition()
+        self.closed = False
+        self.error = None
+        self.n_dropped = 0
+
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while len(self.queue) == 0 and not self.closed:
+                    self.cond.wait()
+                if len(self.queue) == 0:
+                    return
+                args = self.queue.popleft()
+
+            try:
+                self.func(*args)
+            except BaseException as e:
+                with self.cond:
+                    self.error = e
+                    self.queue.clear()
+                    self.closed = True
+                return
+
+    def _raise(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def submit(self, *args):
+        """ Queues a call of the function, dropping the oldest pending one if needed """
+
+        with self.cond:
+            self._raise()
+            if self.closed:
+                return
+            if len(self.queue) == self.queue.maxlen:
+                self.n_dropped += 1
+            self.queue.append(args)
+            self.cond.notify()
+
+    def close(self):
+        """ Waits for the pending calls to finish and terminates the thread """
+
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+        self.thread.join()
+        self._raise()
@@ -0,0 +1,265 @@
+# Copyright (c) 2019 Robin Scheibler
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+The source models of the auxiliary function based algorithms. A model is
+defined by the contrast function G of the vector y[t] of a source over all
+the frequencies, the negative log-likelihood of the source being
+
+    sum_t G(||y[t]||)
+
+The algorithms only need the auxiliary variables
+
+    r[t] = 2 ||y[t]|| / G'(||y[t]||)
+
+whose inverses weight the frames in the covariance matrices of the sources.
+They are computed by the models from the squared norms of the sources, for
+all the frames and sources at once, in preallocated arrays.
+
+New models are added by subclassing :py:class:`SourceModel` and adding them
+to the ``models`` registry, after which they can be selected by name with
+the ``model`` option of the algorithms.
+"""
+import numpy as np
+from scipy.ndimage import uniform_filter1d
+
+
+class SourceModel(object):
+    """
+    Base class of the source models.
+
+    The attribute ``degree`` is the degree of homogeneity of the auxiliary
+    variables with respect to the scale of the sources, i.e., scaling the
+    sources by ``c`` scales the auxiliary variables by ``c ** degree``. The
+    algorithms use it to normalize the auxiliary variables, and rescale the
+    demixing matrices accordingly. It is ``None`` for the models that are
+    not scale invariant, whose auxiliary variables are then used as is.
+    """
+
+    degree = None
+
+    def auxiliary(self, norms, n_freq, r):
+        """
+        Computes the auxiliary variables
+
+        Parameters
+        ----------
+        norms: ndarray (..., n_frames, n_src)
+            The squared norms of the sources, summed over the frequencies
+        n_freq: int
+            The number of frequencies
+        r: ndarray (..., n_frames, n_src)
+            The array where to store the auxiliary variables
+
+        Returns
+        -------
+        The value of the contrast summed over all the frames and sources
+        """
+        raise NotImplementedError
+
+    def scale(self, gamma):
+        """
+        The factors dividing the demixing vectors of the sources when their
+        auxiliary variables are divided by ``gamma``
+        """
+        return gamma ** (1.0 / self.degree)
+
+
+class Laplace(SourceModel):
+    """ The spherical Laplace model, G(y) = ||y|| """
+
+    degree = 1
+
+    def auxiliary(self, norms, n_freq, r):
+        np.sqrt(norms, out=r)
+        r *= 2.0
+        return 0.5 * np.sum(r, dtype=np.float64)
+
+    def scale(self, gamma):
+        return gamma
+
+
+class Gauss(SourceModel):
+    """
+    The time-varying Gaussian model, the variance of a frame being the same
+    for all the frequencies, G(y) = nfrequencies * log ||y||^2
+    """
+
+    degree = 2
+
+    def auxiliary(self, norms, n_freq, r):
+        np.divide(norms, n_freq, out=r)
+        return n_freq * np.sum(np.log(np.maximum(r, 1e-15)), dtype=np.float64)
+
+    def scale(self, gamma):
+        return np.sqrt(gamma)
+
+
+class GeneralizedGaussian(SourceModel):
+    """
+    The spherical generalized Gaussian model, G(y) = ||y|| ** beta. The
+    Laplace model is the special case ``beta = 1``.
+
+    The auxiliary variables are ``2 / beta * ||y|| ** (2 - beta)``. Unlike
+    those of the Laplace model, they are not normalized: the rescaling of
+    the demixing matrices that goes with it would increase the cost when
+    ``beta`` is not 1, while the updates alone decrease it monotonically.
+
+    Parameters
+    ----------
+    beta: float, optional
+        The shape parameter, between 0 and 2 (default 0.5)
+    """
+
+    def __init__(self, beta=0.5):
+
+        if not 0.0 < beta < 2.0:
+            raise ValueError("The shape parameter should be between 0 and 2")
+
+        self.beta = beta
+
+    def auxiliary(self, norms, n_freq, r):
+        cost = np.sum(norms ** (0.5 * self.beta), dtype=np.float64)
+        np.power(norms, 1.0 - 0.5 * self.beta, out=r)
+        r *= 2.0 / self.beta
+        return cost
+
+
+class StudentT(SourceModel):
+    """
+    The spherical Student's t model with ``nu`` degrees of freedom and unit
+    variance in every frequency,
+
+        G(y) = (nfrequencies + nu / 2) * log(1 + ||y||^2 / nu)
+
+    it is not scale invariant and the scale of the demixing matrices is left
+    to the updates.
+
+    Parameters
+    ----------
+    nu: float, optional
+        The number of degrees of freedom, the smaller, the heavier the tails
+        of the distribution (default 1)
+    """
+
+    def __init__(self, nu=1.0):
+
+        if nu <= 0.0:
+            raise ValueError("The number of degrees of freedom should be positive")
+
+        self.nu = nu
+
+    def auxiliary(self, norms, n_freq, r):
+        c = n_freq + 0.5 * self.nu
+        cost = c * np.sum(np.log1p(norms / self.nu), dtype=np.float64)
+        np.add(norms, self.nu, out=r)
+        r /= c
+        return cost
+
+
+class SmoothGauss(SourceModel):
+    """
+    The time-varying Gaussian model where the variance of a frame is
+    averaged over ``smoothing`` consecutive frames centered on it, which
+    makes the estimation more robust for short or noisy frames. It is the
+    same as the 'gauss' model when ``smoothing`` is 1.
+
+    The contrast is ``nfrequencies * sum_t log var[t]``, where ``var`` is
+    the averaged variance, the frames beyond the ends counting as zero.
+    Since the averaged variance depends on the neighbouring frames, the
+    weight of a frame in the covariance is the average of the inverse
+    variances of all the windows it belongs to, rather than its own inverse
+    variance.
+
+    Parameters
+    ----------
+    smoothing: int, optional
+        The number of frames of the moving average (default 3)
+    """
+
+    degree = 2
+
+    def __init__(self, smoothing=3):
+
+        if smoothing < 1:
+            raise ValueError("The smoothing should be at least one frame")
+
+        self.smoothing = smoothing
+
+    def auxiliary(self, norms, n_freq, r):
+        # the averaged variance of the frames, var = A @ norms / n_freq
+        var = uniform_filter1d(norms, self.smoothing, axis=-2, mode="constant")
+        var /= n_freq
+        np.maximum(var, 1e-15, out=var)
+
+        # The majorization of the concave log,
+        #
+        #   log var[t] <= log v[t] + (var[t] - v[t]) / v[t]
+        #
+        # at the current variance v, gives once summed over the frames
+        #
+        #   n_freq * sum_t log var[t] <= sum_t norms[t] / r[t] + const
+        #
+        # with 1 / r = A.T @ (1 / v). Zero padding makes A symmetric, up to
+        # the shift of the windows of even length, undone by the origin.
+        uniform_filter1d(
+            1.0 / var,
+            self.smoothing,
+            axis=-2,
+            output=r,
+            mode="constant",
+            origin=self.smoothing % 2 - 1,
+        )
+        np.reciprocal(r, out=r)
+
+        # the majorizing function at the current point, i.e., the contrast
+        # plus n_freq for every frame whose variance is above the floor
+        return np.sum(norms / r + n_freq * np.log(var), dtype=np.float64)
+
+    def scale(self, gamma):
+        return np.sqrt(gamma)
+
+
+# the models that can be selected by name, with their default parameters
+models = {
+    "laplace": Laplace,
+    "gauss": Gauss,
+    "ggd": GeneralizedGaussian,
+    "student": StudentT,
+    "smooth_gauss": SmoothGauss,
+}
+
+
+def get_model(model):
+    """
+    Returns the source model object
+
+    Parameters
+    ----------
+    model: str or SourceModel
+        The name of a model of the ``models`` registry, or a model object
+    """
+
+    if isinstance(model, SourceModel):
+        return model
+
+    if model not in models:
+        raise ValueError("Unknown model {}".format(model))
+
+    return models[model]()